@@ -1,20 +1,29 @@
+import argparse
+import hashlib
 import itertools
 import json
+import math
+import os
+import re
+import socket
 import statistics
 import time
 from dataclasses import dataclass
 from datetime import timedelta
-from typing import List, Dict, Callable, Any
+from random import Random
+from typing import List, Dict, Callable, Any, Optional, Union, Tuple
 
-from sklearn.model_selection import cross_val_score
-from sklearn.neural_network import MLPClassifier
-from sklearn.tree import DecisionTreeClassifier
-
-from database import Database
-from datasets import timeline_to_sklearn_dataset, Dicterizer, TimelineDataset
-from dicterizers import counting_dicterizer
-from focals import Focal, FocalGroupSpan
-from processors import focals_to_timeline_dataset, TimelineProcessor, FilterAndSliceToMostRecentProcessor, WindowingProcessor
+from dataset_caches import DatasetCache, dataset_cache_key
+from database import Database, add_focal_filter_arguments, focal_filter_from_arguments
+from datasets import timeline_to_sklearn_dataset, Dicterizer, TimelineDataset, FeatureClass, timeline_to_hashed_batches, SklearnDataset
+from dicterizers import counting_dicterizer, log_counting_dicterizer, decay_dicterizer, CooccurrenceDicterizer
+from focals import Focal, FocalGroupSpan, focal_fingerprint, corpus_fingerprint
+from processors import focals_to_timeline_dataset, focals_to_metrics, TimelineProcessor, FilterAndSliceToMostRecentProcessor, WindowingProcessor, \
+    NegativeSampling, FocalDatasets
+from vocabularies import Vocabulary, VocabularySettings, build_vocabulary
+from pipelines import pipelined
+from timeouts import call_with_timeout, Timeout
+from work_queues import TaskQueue, WorkerId, MongoTaskQueue, renewed_lease
 
 
 @dataclass(frozen=True)
@@ -26,69 +35,583 @@ class BenchmarkResult:
     score_avg: float
     score_std: float
     metrics: TimelineDataset.Metrics
+    vocabulary: Optional[VocabularySettings] = None
+    vocabulary_size: Optional[int] = None
+    timed_out: bool = False
+    fingerprint: Optional[str] = None
+    error: Optional[str] = None
+
+    @staticmethod
+    def from_dict(doc: Dict) -> 'BenchmarkResult':
+        vocabulary = doc.get('vocabulary')
+        return BenchmarkResult(processor=doc['processor'],
+                               dicterizer=doc['dicterizer'],
+                               classifier=doc['classifier'],
+                               scores=doc['scores'],
+                               score_avg=doc['score_avg'],
+                               score_std=doc['score_std'],
+                               metrics=TimelineDataset.Metrics(**doc['metrics']),
+                               vocabulary=None if vocabulary is None else VocabularySettings(vocabulary['min_focals'],
+                                                                                            vocabulary['max_size'],
+                                                                                            frozenset(vocabulary['excluded'])),
+                               vocabulary_size=doc.get('vocabulary_size'),
+                               timed_out=doc.get('timed_out', False),
+                               fingerprint=doc.get('fingerprint'),
+                               error=doc.get('error'))
+
+    def key(self) -> str:
+        return result_key(self.processor, self.dicterizer, self.classifier)
 
 
 ClassifierFactory = Callable[[], Any]
 
 
+def processor_dict(processor: TimelineProcessor) -> Dict:
+    return {**Database.to_dict(processor), 'type': processor.__class__.__name__}
+
+
+def result_key(processor: Dict, dicterizer: str, classifier: str) -> str:
+    return json.dumps([processor, dicterizer, classifier], sort_keys=True)
+
+
+@dataclass(frozen=True)
+class StreamingMode:
+    n_features: int = 2 ** 20
+    batch_size: int = 1000
+
+
+def dataset_fingerprint(focals: List[Focal], processor: TimelineProcessor, focal_fingerprints: Dict[str, str],
+                        vocabulary: Optional[Vocabulary] = None, sampling: Optional[NegativeSampling] = None,
+                        streaming: Optional[StreamingMode] = None) -> str:
+    digest = hashlib.sha1()
+    for focal in focals:
+        if processor.labels(focal.timeline)[0]:
+            digest.update(focal_fingerprints[focal.name].encode('utf-8'))
+    if vocabulary is not None:
+        digest.update('\n'.join(vocabulary.names).encode('utf-8'))
+    if sampling is not None:
+        digest.update(repr(sampling).encode('utf-8'))
+    if streaming is not None:
+        digest.update(repr(streaming).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def dicterizer_fingerprint(fingerprint: Optional[str], dicterizer_name: str, corpus: Optional[str]) -> Optional[str]:
+    if fingerprint is None or dicterizer_name not in CORPUS_DICTERIZERS:
+        return fingerprint
+    return hashlib.sha1(f'{fingerprint}\n{corpus}'.encode('utf-8')).hexdigest()
+
+
+@dataclass(frozen=True)
+class TimeBudget:
+    iteration: Optional[float] = None
+    run: Optional[float] = None
+
+
+def streaming_scores(classifier, dataset: Union[TimelineDataset, FocalDatasets], dicterizer: Dicterizer, mode: StreamingMode,
+                     vocabulary: Optional[Vocabulary] = None) -> List[float]:
+    classes = [FeatureClass.NEGATIVE.value, FeatureClass.POSITIVE.value]
+    names = None if vocabulary is None else vocabulary.names
+    for batch in timeline_to_hashed_batches(dataset, dicterizer, False, mode.n_features, mode.batch_size, names):
+        classifier.partial_fit(batch.X, batch.y, classes=classes)
+    correct = 0
+    total = 0
+    for batch in timeline_to_hashed_batches(dataset, dicterizer, True, mode.n_features, mode.batch_size, names):
+        correct += int((classifier.predict(batch.X) == batch.y).sum())
+        total += len(batch.y)
+    return [correct / total if total > 0 else float('nan')]
+
+
+def streamable_dataset(focals: List[Focal], processor: TimelineProcessor, sampling: Optional[NegativeSampling] = None,
+                       streaming: Optional[StreamingMode] = None) -> Union[TimelineDataset, FocalDatasets]:
+    if streaming is None:
+        return focals_to_timeline_dataset(focals, processor, sampling)
+    return FocalDatasets(focals, processor, sampling)
+
+
+def run(processor: TimelineProcessor,
+        timeline_dataset: Union[TimelineDataset, FocalDatasets],
+        dicterizer: Dicterizer,
+        classifier_factory: ClassifierFactory,
+        streaming: Optional[StreamingMode] = None,
+        vocabulary: Optional[Vocabulary] = None,
+        timeout: Optional[float] = None,
+        fingerprint: Optional[str] = None,
+        sklearn_dataset: Optional[SklearnDataset] = None,
+        metrics: Optional[TimelineDataset.Metrics] = None) -> BenchmarkResult:
+    classifier = classifier_factory()
+
+    def score() -> List[float]:
+        from sklearn.model_selection import cross_val_score
+        if streaming is None:
+            dataset = sklearn_dataset
+            if dataset is None:
+                dataset = timeline_to_sklearn_dataset(timeline_dataset, dicterizer, shuffle_classes=False,
+                                                      vocabulary=None if vocabulary is None else vocabulary.names)
+            return list(cross_val_score(classifier, dataset.X, dataset.y, cv=dataset.splits))
+        return streaming_scores(classifier, timeline_dataset, dicterizer, streaming, vocabulary)
+
+    timed_out = False
+    if timeout is None:
+        scores = score()
+    elif timeout <= 0:
+        scores, timed_out = [], True
+    else:
+        try:
+            scores = call_with_timeout(score, timeout)
+        except Timeout:
+            scores, timed_out = [], True
+    if timed_out:
+        score_avg, score_std = float('nan'), float('nan')
+    else:
+        score_avg = statistics.mean(scores) if len(scores) > 1 else scores[0]
+        score_std = statistics.stdev(scores) if len(scores) > 1 else 0
+    return BenchmarkResult(processor=processor_dict(processor),
+                           dicterizer=dicterizer.__name__,
+                           classifier=str(classifier),
+                           scores=scores,
+                           score_avg=score_avg,
+                           score_std=score_std,
+                           metrics=timeline_dataset.metrics() if metrics is None else metrics,
+                           vocabulary=None if vocabulary is None else vocabulary.settings,
+                           vocabulary_size=None if vocabulary is None else len(vocabulary.names),
+                           timed_out=timed_out,
+                           fingerprint=fingerprint)
+
+
+@dataclass
+class PreparedProcessor:
+    processor: TimelineProcessor
+    fingerprint: Optional[str]
+    reused: Dict[int, BenchmarkResult]
+    timeline_dataset: Union[TimelineDataset, FocalDatasets, None]
+    sklearn_datasets: Dict[str, SklearnDataset]
+    metrics: Optional[TimelineDataset.Metrics]
+    seconds: float
+
+
 def benchmark(focals: List[Focal],
               processors: List[TimelineProcessor],
               dicterizers: List[Dicterizer],
-              classifier_factories: List[ClassifierFactory]) -> List[BenchmarkResult]:
+              classifier_factories: List[ClassifierFactory],
+              streaming: Optional[StreamingMode] = None,
+              vocabulary: Optional[Vocabulary] = None,
+              budget: TimeBudget = TimeBudget(),
+              previous_results: Optional[List[BenchmarkResult]] = None,
+              sampling: Optional[NegativeSampling] = None,
+              pipeline_depth: int = 0,
+              cache: Optional[DatasetCache] = None) -> List[BenchmarkResult]:
     results: List[BenchmarkResult] = []
     i = 1
     sklearn_dataset_inputs = list(itertools.product(dicterizers, classifier_factories))
-    for processor in processors:
-        timeline_dataset = focals_to_timeline_dataset(focals, processor)
-        for dicterizer, classifier_factory in sklearn_dataset_inputs:
+    expected_iterations = len(processors) * len(sklearn_dataset_inputs)
+    fingerprinted = previous_results is not None
+    budgeted = budget.iteration is not None or budget.run is not None
+    if budgeted and pipeline_depth > 0:
+        print('Pipelining disabled: budgeted combinations run in forked processes, which must not fork alongside the pipeline thread.')
+        pipeline_depth = 0
+    focal_fingerprints = {focal.name: focal_fingerprint(focal) for focal in focals} if fingerprinted else {}
+    previous = {result.key(): result for result in previous_results or [] if not result.timed_out and result.error is None}
+    classifier_names = [str(classifier_factory()) for classifier_factory in classifier_factories] if previous else []
+    corpus = corpus_fingerprint(focals) if fingerprinted or cache is not None else None
+    settings = ['\n'.join(vocabulary.names) if vocabulary is not None else '', repr(sampling), repr(streaming)]
+    reused = 0
+    cached = 0
+    dataset_seconds: List[float] = []
+    iteration_seconds: List[float] = []
+    run_start = time.time()
+
+    def prepare(processor: TimelineProcessor) -> PreparedProcessor:
+        t_start = time.time()
+        if budget.run is not None and t_start - run_start >= budget.run:
+            return PreparedProcessor(processor, None, {}, None, {}, TimelineDataset.metrics_of([], []), 0)
+        fingerprint = dataset_fingerprint(focals, processor, focal_fingerprints, vocabulary, sampling, streaming) if fingerprinted else None
+        reusable: Dict[int, BenchmarkResult] = {}
+        for index, (dicterizer, classifier_name) in enumerate(itertools.product(dicterizers, classifier_names)):
+            previous_result = previous.get(result_key(processor_dict(processor), dicterizer.__name__, classifier_name))
+            if previous_result is not None and \
+                    previous_result.fingerprint == dicterizer_fingerprint(fingerprint, dicterizer.__name__, corpus):
+                reusable[index] = previous_result
+        timeline_dataset = None
+        sklearn_datasets: Dict[str, SklearnDataset] = {}
+        metrics = None
+        pending = {dicterizer.__name__: dicterizer for index, (dicterizer, _) in enumerate(sklearn_dataset_inputs) if index not in reusable}
+        cache_keys = {name: dataset_cache_key(corpus, *settings, json.dumps(processor_dict(processor), sort_keys=True, default=str), name)
+                      for name in pending} if cache is not None and streaming is None else {}
+        for name, key in cache_keys.items():
+            cached_dataset = cache.get(key)
+            if cached_dataset is not None:
+                sklearn_datasets[name], metrics = cached_dataset
+        if streaming is not None or len(sklearn_datasets) < len(pending):
+            timeline_dataset = streamable_dataset(focals, processor, sampling, streaming)
+            for name, dicterizer in pending.items():
+                if streaming is None and not budgeted and name not in sklearn_datasets:
+                    sklearn_datasets[name] = timeline_to_sklearn_dataset(
+                        timeline_dataset, dicterizer, shuffle_classes=False, vocabulary=None if vocabulary is None else vocabulary.names)
+                    if name in cache_keys:
+                        cache.put(cache_keys[name], sklearn_datasets[name], timeline_dataset.metrics())
+        return PreparedProcessor(processor, fingerprint, reusable, timeline_dataset, sklearn_datasets, metrics, time.time() - t_start)
+
+    prepared_processors = pipelined((prepare(processor) for processor in processors), pipeline_depth)
+    for processor_index, prepared in enumerate(prepared_processors):
+        if len(prepared.reused) < len(sklearn_dataset_inputs):
+            dataset_seconds.append(prepared.seconds)
+        if prepared.timeline_dataset is None and len(prepared.sklearn_datasets) > 0:
+            cached += 1
+        for index, (dicterizer, classifier_factory) in enumerate(sklearn_dataset_inputs):
+            if index in prepared.reused:
+                results.append(prepared.reused[index])
+                reused += 1
+                i += 1
+                continue
             t_start = time.time()
-            sklearn_dataset = timeline_to_sklearn_dataset(timeline_dataset, dicterizer, shuffle_classes=False)
-            classifier = classifier_factory()
-            scores = cross_val_score(classifier, sklearn_dataset.X, sklearn_dataset.y, cv=sklearn_dataset.splits)
-            results.append(
-                BenchmarkResult(processor={**Database.to_dict(processor), 'type': processor.__class__.__name__},
-                                dicterizer=dicterizer.__name__,
-                                classifier=str(classifier),
-                                scores=scores,
-                                score_avg=statistics.mean(scores) if len(scores) > 1 else scores[0],
-                                score_std=statistics.stdev(scores) if len(scores) > 1 else 0,
-                                metrics=timeline_dataset.metrics()))
+            timeout = budget.iteration
+            if budget.run is not None:
+                run_left = budget.run - (t_start - run_start)
+                timeout = run_left if timeout is None else min(timeout, run_left)
+            result = run(prepared.processor, prepared.timeline_dataset, dicterizer, classifier_factory, streaming, vocabulary,
+                         timeout, dicterizer_fingerprint(prepared.fingerprint, dicterizer.__name__, corpus),
+                         prepared.sklearn_datasets.get(dicterizer.__name__), prepared.metrics)
+            results.append(result)
             t_end = time.time()
             rate = round(t_end - t_start, 2)
-            expected_iterations = len(processors) * len(sklearn_dataset_inputs)
-            print(f'Benchmark iteration: {i} / {expected_iterations} (rate: 1/{rate}, estimated time left: {(expected_iterations - i) * rate / 3600}h')
+            iteration_seconds.append(t_end - t_start)
+            time_left = (len(processors) - processor_index - 1) * statistics.mean(dataset_seconds) + \
+                (expected_iterations - i) * statistics.mean(iteration_seconds)
+            status = ' timed out' if result.timed_out else ''
+            print(f'Benchmark iteration: {i} / {expected_iterations}{status} (rate: 1/{rate}, estimated time left: {time_left / 3600}h')
             i += 1
+    if previous_results is not None:
+        print(f'Reused {reused} / {expected_iterations} results whose inputs did not change.')
+    if cache is not None:
+        print(f'Loaded the datasets of {cached} / {len(processors)} processors from the dataset cache.')
     return results
 
 
+@dataclass(frozen=True)
+class BenchmarkTask:
+    processor: TimelineProcessor
+    dicterizer: str
+    classifier: str
+    streaming: Optional[StreamingMode] = None
+    vocabulary: Optional[VocabularySettings] = None
+    sampling: Optional[NegativeSampling] = None
+
+
+def benchmark_tasks(processors: List[TimelineProcessor],
+                    dicterizers: List[Dicterizer],
+                    classifier_factories: List[ClassifierFactory],
+                    streaming: Optional[StreamingMode] = None,
+                    vocabulary: Optional[VocabularySettings] = None,
+                    sampling: Optional[NegativeSampling] = None) -> List[BenchmarkTask]:
+    return [BenchmarkTask(processor, dicterizer.__name__, classifier_factory.__name__, streaming, vocabulary, sampling)
+            for processor in processors for dicterizer, classifier_factory in itertools.product(dicterizers, classifier_factories)]
+
+
+def work(focals: List[Focal], queue: TaskQueue, worker: WorkerId, lease: timedelta, poll_interval: float = 5) -> int:
+    processor: Optional[TimelineProcessor] = None
+    timeline_dataset: Union[TimelineDataset, FocalDatasets, None] = None
+    streaming: Optional[StreamingMode] = None
+    vocabularies: Dict[VocabularySettings, Vocabulary] = {}
+    dicterizers: Dict[str, Dicterizer] = {}
+    done = 0
+    seen_open = False
+    while True:
+        task = queue.claim(worker, lease)
+        if task is None:
+            is_open = queue.is_open()
+            if (is_open and queue.unfinished() == 0) or (seen_open and not is_open):
+                return done
+            seen_open = seen_open or is_open
+            time.sleep(poll_interval)
+            continue
+        seen_open = True
+        benchmark_task: BenchmarkTask = task.payload
+        if benchmark_task.processor != processor or benchmark_task.streaming != streaming:
+            processor = benchmark_task.processor
+            streaming = benchmark_task.streaming
+            timeline_dataset = streamable_dataset(focals, processor, benchmark_task.sampling, streaming)
+        vocabulary = None
+        if benchmark_task.vocabulary is not None:
+            if benchmark_task.vocabulary not in vocabularies:
+                vocabularies[benchmark_task.vocabulary] = build_vocabulary(focals, benchmark_task.vocabulary)
+            vocabulary = vocabularies[benchmark_task.vocabulary]
+        if benchmark_task.dicterizer not in dicterizers:
+            dicterizers[benchmark_task.dicterizer] = resolve_dicterizer(benchmark_task.dicterizer, focals)
+        with renewed_lease(queue, task.id, worker, lease):
+            result = run(processor,
+                         timeline_dataset,
+                         dicterizers[benchmark_task.dicterizer],
+                         CLASSIFIERS[benchmark_task.classifier],
+                         benchmark_task.streaming,
+                         vocabulary)
+        if not queue.complete(task.id, worker, result):
+            print(f'Worker {worker} lost the lease of task {task.id}, its result was dropped')
+            continue
+        done += 1
+        print(f'Worker {worker} finished task {task.id} ({queue.unfinished()} unfinished)')
+
+
+def wait_for_results(queue: TaskQueue, poll_interval: float = 5) -> List[BenchmarkResult]:
+    while True:
+        unfinished = queue.unfinished()
+        if unfinished == 0:
+            results = queue.results()
+            queue.close()
+            return results
+        print(f'Waiting for workers: {unfinished} task(s) unfinished')
+        time.sleep(poll_interval)
+
+
 @dataclass
 class FilteredBenchmarkResults:
     accepted: List[BenchmarkResult]
     off_limits: List[BenchmarkResult]
 
 
+def within_limits(metrics: TimelineDataset.Metrics, test_to_training_min_value, test_class_ratio_max_divergence) -> bool:
+    return abs(metrics.test_class_ratio - 0.5) <= test_class_ratio_max_divergence and metrics.test_to_training_ratio >= test_to_training_min_value
+
+
 def filter(benchmark_results: List[BenchmarkResult], test_to_training_min_value,
            test_class_ratio_max_divergence) -> FilteredBenchmarkResults:
     filtered_results = FilteredBenchmarkResults([], [])
     for result in benchmark_results:
-        if abs(result.metrics.test_class_ratio - 0.5) <= test_class_ratio_max_divergence and result.metrics.test_to_training_ratio >= test_to_training_min_value:
+        if not result.timed_out and result.error is None and within_limits(result.metrics, test_to_training_min_value, test_class_ratio_max_divergence):
             filtered_results.accepted.append(result)
         else:
             filtered_results.off_limits.append(result)
     return filtered_results
 
 
+@dataclass
+class PrunedProcessors:
+    accepted: List[TimelineProcessor]
+    pruned: List[TimelineProcessor]
+
+
+def prune(focals: List[Focal], processors: List[TimelineProcessor], test_to_training_min_value,
+          test_class_ratio_max_divergence, sampling: Optional[NegativeSampling] = None) -> PrunedProcessors:
+    pruned_processors = PrunedProcessors([], [])
+    for processor in processors:
+        metrics = focals_to_metrics(focals, processor, sampling)
+        if within_limits(metrics, test_to_training_min_value, test_class_ratio_max_divergence):
+            pruned_processors.accepted.append(processor)
+        else:
+            pruned_processors.pruned.append(processor)
+    return pruned_processors
+
+
+Configuration = Tuple[TimelineProcessor, Dicterizer, ClassifierFactory]
+
+
+@dataclass(frozen=True)
+class HalvingRound:
+    round: int
+    focals: int
+    configurations: int
+    promoted: int
+    seconds: float
+    results: List[BenchmarkResult]
+
+
+@dataclass(frozen=True)
+class HalvingSearch:
+    rounds: List[HalvingRound]
+    results: List[BenchmarkResult]
+
+
+def halving_fractions(min_fraction: float, keep: float) -> List[float]:
+    if not 0 < min_fraction <= 1:
+        raise ValueError(f'The halving minimum fraction must be in (0, 1], got {min_fraction}')
+    if not 0 < keep < 1:
+        raise ValueError(f'The halving keep fraction must be in (0, 1), got {keep}')
+    rounds = max(1, math.ceil(math.log(min_fraction) / math.log(keep)) + 1) if min_fraction < 1 else 1
+    return [min_fraction / keep ** i for i in range(rounds - 1)] + [1.0]
+
+
+def successive_halving(focals: List[Focal],
+                       processors: List[TimelineProcessor],
+                       dicterizers: List[Dicterizer],
+                       classifier_factories: List[ClassifierFactory],
+                       test_to_training_min_value,
+                       test_class_ratio_max_divergence,
+                       min_fraction: float = 0.1,
+                       keep: float = 0.5,
+                       seed: int = 0,
+                       streaming: Optional[StreamingMode] = None,
+                       vocabulary: Optional[Vocabulary] = None,
+                       budget: TimeBudget = TimeBudget(),
+                       sampling: Optional[NegativeSampling] = None) -> HalvingSearch:
+    shuffled = focals.copy()
+    Random(seed).shuffle(shuffled)
+    configurations = list(itertools.product(processors, dicterizers, classifier_factories))
+    rounds: List[HalvingRound] = []
+    fractions = halving_fractions(min_fraction, keep)
+    for round_index, fraction in enumerate(fractions):
+        t_start = time.time()
+        subsample = shuffled[:max(1, round(fraction * len(shuffled)))]
+        ranked = []
+        groups: Dict[int, List[Configuration]] = {}
+        for configuration in configurations:
+            groups.setdefault(id(configuration[0]), []).append(configuration)
+        for group in groups.values():
+            processor = group[0][0]
+            timeline_dataset = streamable_dataset(subsample, processor, sampling, streaming)
+            for configuration in group:
+                try:
+                    result = run(processor, timeline_dataset, configuration[1], configuration[2], streaming, vocabulary,
+                                 budget.iteration)
+                except ValueError as e:
+                    result = BenchmarkResult(processor=processor_dict(processor),
+                                             dicterizer=configuration[1].__name__,
+                                             classifier=str(configuration[2]()),
+                                             scores=[],
+                                             score_avg=float('nan'),
+                                             score_std=float('nan'),
+                                             metrics=timeline_dataset.metrics(),
+                                             vocabulary=None if vocabulary is None else vocabulary.settings,
+                                             vocabulary_size=None if vocabulary is None else len(vocabulary.names),
+                                             error=str(e))
+                accepted = not result.timed_out and result.error is None and \
+                    within_limits(result.metrics, test_to_training_min_value, test_class_ratio_max_divergence)
+                score = result.score_avg if accepted and not math.isnan(result.score_avg) else -math.inf
+                ranked.append(((accepted, score), configuration, result))
+        ranked.sort(key=lambda entry: entry[0], reverse=True)
+        promoted = len(ranked) if round_index == len(fractions) - 1 else math.ceil(keep * len(ranked))
+        rounds.append(HalvingRound(round=round_index,
+                                   focals=len(subsample),
+                                   configurations=len(configurations),
+                                   promoted=promoted,
+                                   seconds=time.time() - t_start,
+                                   results=[result for _, _, result in ranked]))
+        print(f'Halving round {round_index}: {len(configurations)} configuration(s) on {len(subsample)} focal(s), '
+              f'{promoted} promoted after {round(rounds[-1].seconds, 1)}s')
+        configurations = [configuration for _, configuration, _ in ranked[:promoted]]
+    return HalvingSearch(rounds, rounds[-1].results if len(rounds) > 0 else [])
+
+
 def to_json(object) -> str:
     return json.dumps(object.__dict__, indent=4, default=lambda o: o.__dict__ if hasattr(o, '__dict__') else str(o))
 
 
+def report(database: Database, results: List[BenchmarkResult], filtered_results: FilteredBenchmarkResults):
+    if len(filtered_results.accepted) > 0:
+        summary_avg = statistics.mean((r.score_avg for r in filtered_results.accepted))
+        summary_std = statistics.mean((r.score_std for r in filtered_results.accepted))
+        print('Summary avg: ' + str(summary_avg))
+        print('Summary std: ' + str(summary_std))
+        database.save('results_accepted', filtered_results.accepted)
+        print('Accepted results saved.')
+    else:
+        database.drop('results_accepted')
+        print('No accepted results.')
+    if len(filtered_results.off_limits) > 0:
+        database.save('results_off_limits', filtered_results.off_limits)
+        print('Off-limits results saved.')
+    else:
+        database.drop('results_off_limits')
+        print('No off-limits results.')
+    database.drop('results_all')
+    database.save('results_all', results)
+
+
+def decision_tree_classifier():
+    from sklearn.tree import DecisionTreeClassifier
+    return DecisionTreeClassifier()
+
+
 def mlp_classifier():
+    from sklearn.neural_network import MLPClassifier
     return MLPClassifier()
 
 
+def sgd_classifier():
+    from sklearn.linear_model import SGDClassifier
+    return SGDClassifier()
+
+
+DICTERIZERS: Dict[str, Dicterizer] = {dicterizer.__name__: dicterizer for dicterizer in
+                                      [counting_dicterizer, log_counting_dicterizer]}
+CORPUS_DICTERIZERS: Dict[str, Callable[[List[Focal]], Dicterizer]] = {'cooccurrence_dicterizer': CooccurrenceDicterizer}
+CLASSIFIERS: Dict[str, ClassifierFactory] = {classifier_factory.__name__: classifier_factory for classifier_factory in
+                                             [decision_tree_classifier, mlp_classifier, sgd_classifier]}
+
+
+DECAY_DICTERIZER_NAME = re.compile(r'decay_dicterizer\(([0-9]*\.?[0-9]+)\)')
+
+
+def known_dicterizer(name: str) -> bool:
+    return name in DICTERIZERS or name in CORPUS_DICTERIZERS or DECAY_DICTERIZER_NAME.fullmatch(name) is not None
+
+
+def resolve_dicterizer(name: str, focals: List[Focal]) -> Dicterizer:
+    if name in CORPUS_DICTERIZERS:
+        return CORPUS_DICTERIZERS[name](focals)
+    match = DECAY_DICTERIZER_NAME.fullmatch(name)
+    if match is not None:
+        return decay_dicterizer(timedelta(days=float(match.group(1))))
+    return DICTERIZERS[name]
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Run the benchmark.')
+    parser.add_argument('--mode', choices=['local', 'coordinator', 'worker'], default='local',
+                        help='local (run everything in this process), coordinator (enqueue tasks in the database and wait for workers), worker (run queued tasks)')
+    parser.add_argument('--lease', type=int, default=3600, help='seconds after which a task claimed by a silent worker is reclaimed; running workers renew it every third of that')
+    parser.add_argument('--streaming', action='store_true',
+                        help='hash features and train incrementally (partial_fit) in mini-batches instead of building the whole matrix')
+    parser.add_argument('--n-features', type=int, default=StreamingMode.n_features, help='width of the hashed feature space')
+    parser.add_argument('--batch-size', type=int, default=StreamingMode.batch_size, help='samples per mini-batch')
+    parser.add_argument('--load-parallelism', type=int, default=1, help='number of focal partitions loaded concurrently')
+    add_focal_filter_arguments(parser)
+    parser.add_argument('--min-focals', type=int, default=VocabularySettings.min_focals,
+                        help='drop features referenced by fewer focals than this')
+    parser.add_argument('--max-vocabulary', type=int, default=VocabularySettings.max_size,
+                        help='keep only this many features, the ones referenced by the most focals')
+    parser.add_argument('--exclude', nargs='*', default=[], help='features never to use')
+    parser.add_argument('--iteration-budget', type=float, default=None,
+                        help='seconds one processor/dicterizer/classifier combination may take before it is recorded as timed out')
+    parser.add_argument('--run-budget', type=float, default=None,
+                        help='seconds the whole benchmark may take; combinations past it are recorded as timed out')
+    parser.add_argument('--refresh', action='store_true',
+                        help='reuse stored results (results_all) whose focals and references did not change and recompute the rest')
+    parser.add_argument('--negative-ratio', type=float, default=None,
+                        help='keep all positive samples and only this many negative samples per positive one')
+    parser.add_argument('--sampling-seed', type=int, default=NegativeSampling.seed, help='seed of the negative sampling')
+    parser.add_argument('--pipeline-depth', type=int, default=0,
+                        help='number of processors whose datasets are built and vectorized ahead, in a background thread, while classifiers are fitted')
+    parser.add_argument('--cooccurrence', action='store_true',
+                        help='also benchmark features propagated through the corpus entity co-occurrence matrix')
+    parser.add_argument('--decay-half-life', type=float, nargs='+', default=[],
+                        help='also benchmark features weighted by recency, halving every this many days (one dicterizer per value)')
+    parser.add_argument('--no-prune', action='store_true',
+                        help='evaluate every processor instead of skipping the ones whose metrics are known to be off limits')
+    parser.add_argument('--dataset-cache', default=None,
+                        help='directory where vectorized datasets are kept across runs, keyed by their focals, processor and dicterizer')
+    parser.add_argument('--dataset-cache-size', type=float, default=4, help='gigabytes the dataset cache may use')
+    parser.add_argument('--halving', action='store_true',
+                        help='successive halving: evaluate every combination on a seeded subsample of focals and promote the best ones to larger subsamples')
+    parser.add_argument('--halving-min-fraction', type=float, default=0.1, help='fraction of the focals used in the first halving round')
+    parser.add_argument('--halving-keep', type=float, default=0.5,
+                        help='fraction of the combinations promoted to the next round, whose subsample grows by its inverse')
+    parser.add_argument('--halving-seed', type=int, default=0, help='seed of the focal subsamples')
+    args = parser.parse_args()
+    if args.halving:
+        try:
+            halving_fractions(args.halving_min_fraction, args.halving_keep)
+        except ValueError as e:
+            parser.error(str(e))
+    streaming = StreamingMode(args.n_features, args.batch_size) if args.streaming else None
+    sampling = NegativeSampling(args.negative_ratio, args.sampling_seed) if args.negative_ratio is not None else None
     database = Database()
-    focals = database.get_focals()
+    focals = database.get_focals(args.load_parallelism, focal_filter_from_arguments(args))
+    queue = MongoTaskQueue(database.db.benchmark_tasks)
+    if args.mode == 'worker':
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        done = work(focals, queue, worker, timedelta(seconds=args.lease))
+        print(f'Worker {worker} done after {done} task(s).')
+        return
     focal_group_span = FocalGroupSpan(focals)
     highest_distribution_point = focal_group_span.highest_distribution_points()[0]
     print(f'Highest distribution point: {highest_distribution_point}')
@@ -102,33 +625,41 @@ def main():
     # processors = [FilterAndSliceToMostRecentProcessor('@forzegg'), FilterAndSliceToMostRecentProcessor('#TBT')]
     # processors = [FilterAndSliceToMostRecentProcessor(entity_name) for entity_name in entity_names] + [TimepointProcessor(entity_name, highest_distribution_point.timepoint) for entity_name in entity_names] + [SlicingProcessor(entity_name, highest_distribution_point.timepoint) for entity_name in entity_names]
     dicterizers = [counting_dicterizer]
-    classifier_factories = [DecisionTreeClassifier]
-    results = benchmark(focals, processors, dicterizers, classifier_factories)
+    dicterizers += [decay_dicterizer(timedelta(days=days)) for days in args.decay_half_life]
+    if args.cooccurrence:
+        dicterizers.append(CooccurrenceDicterizer(focals))
+    classifier_factories = [decision_tree_classifier] if streaming is None else [sgd_classifier]
     test_to_training_min_value = 0.2
     test_class_ratio_max_divergence = 0.2
+    if not args.no_prune:
+        pruned_processors = prune(focals, processors, test_to_training_min_value, test_class_ratio_max_divergence, sampling)
+        print(f'Pruned {len(pruned_processors.pruned)} / {len(processors)} processors before training.')
+        processors = pruned_processors.accepted
+    vocabulary_settings = VocabularySettings(args.min_focals, args.max_vocabulary, frozenset(args.exclude))
+    vocabulary = build_vocabulary(focals, vocabulary_settings) if vocabulary_settings != VocabularySettings() else None
+    if vocabulary is not None:
+        print(f'Vocabulary: {len(vocabulary.names)} features ({vocabulary_settings})')
+    cache = DatasetCache(args.dataset_cache, int(args.dataset_cache_size * 2 ** 30)) if args.dataset_cache is not None else None
+    if args.halving:
+        search = successive_halving(focals, processors, dicterizers, classifier_factories, test_to_training_min_value,
+                                    test_class_ratio_max_divergence, args.halving_min_fraction, args.halving_keep,
+                                    args.halving_seed, streaming, vocabulary, TimeBudget(args.iteration_budget), sampling)
+        database.save('halving_rounds', search.rounds)
+        results = search.results
+    elif args.mode == 'coordinator':
+        queue.enqueue(benchmark_tasks(processors, dicterizers, classifier_factories, streaming,
+                                      None if vocabulary is None else vocabulary.settings, sampling))
+        results = wait_for_results(queue)
+    else:
+        budget = TimeBudget(args.iteration_budget, args.run_budget)
+        previous_results = [BenchmarkResult.from_dict(doc) for doc in database.load('results_all')] if args.refresh else None
+        results = benchmark(focals, processors, dicterizers, classifier_factories, streaming, vocabulary, budget,
+                            previous_results, sampling, args.pipeline_depth, cache)
     filtered_results = filter(results, test_to_training_min_value, test_class_ratio_max_divergence)
     print(
         f'Filtered results test_to_training_min_value: {test_to_training_min_value}, test_class_ratio_max_divergence: {test_class_ratio_max_divergence}')
     print(to_json(filtered_results))
-    if len(filtered_results.accepted) > 0:
-        summary_avg = statistics.mean((r.score_avg for r in filtered_results.accepted))
-        summary_std = statistics.mean((r.score_std for r in filtered_results.accepted))
-        print('Summary avg: ' + str(summary_avg))
-        print('Summary std: ' + str(summary_std))
-        database.save('results_accepted', filtered_results.accepted)
-        print('Accepted results saved.')
-    else:
-        database.drop('results_accepted')
-        print('No accepted results.')
-    if len(filtered_results.off_limits) > 0:
-        database.save('results_off_limits', filtered_results.off_limits)
-        print('Off-limits results saved.')
-    else:
-        database.drop('results_off_limits')
-        print('No off-limits results.')
-    database.drop('results_all')
-    database.save('results_all', results)
-
+    report(database, results, filtered_results)
 
 if __name__ == '__main__':
     main()
@@ -1,18 +1,30 @@
 import argparse
-from datetime import datetime
+import bz2
+import functools
+import gzip
+import itertools
+import lzma
+import os
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from dataclasses import dataclass
-from typing import List, Dict, Iterator
-
-import numpy
-from pymongo import MongoClient
+from datetime import datetime
+from typing import List, Dict, Iterator, Optional
 
 from focals import Focal
 from timelines import EntityName, Reference
 
+MONGODB_URI_VARIABLE = 'PRELUDIUM_MONGODB_URI'
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017/'
+
+
+@functools.lru_cache(maxsize=None)
+def get_client():
+    from pymongo import MongoClient
+    return MongoClient(os.environ.get(MONGODB_URI_VARIABLE, DEFAULT_MONGODB_URI))
+
 
 def get_local_database():
-    client = MongoClient('mongodb://localhost:27017/')
-    return client['preludium']
+    return get_client()['preludium']
 
 
 def materialize_views():
@@ -20,65 +32,16 @@ def materialize_views():
 
     db.tweets.aggregate([
         {
-            '$set': {
-                'hashtags': {
-                    '$split': [
-                        '$hashtags', ' '
-                    ]
-                },
-                'mentions': {
-                    '$split': [
-                        '$mentions', ' '
-                    ]
-                }
-            }
-        }, {
-            '$set': {
-                'reference': {
-                    '$setUnion': [
-                        '$hashtags', '$mentions', [
-                            {
-                                '$concat': [
-                                    '@', '$to'
-                                ]
-                            }
-                        ]
-                    ]
-                }
-            }
-        }, {
             '$project': {
                 '_id': 1,
                 'date': 1,
-                'focal': {
-                    '$concat': [
-                        '@', '$username'
-                    ]
-                },
-                'reference': '$reference'
+                'focal': 1,
+                'reference': '$references'
             }
         }, {
             '$unwind': {
                 'path': '$reference'
             }
-        }, {
-            '$match': {
-                '$and': [
-                    {
-                        'reference': {
-                            '$ne': ''
-                        }
-                    }, {
-                        'reference': {
-                            '$ne': '@'
-                        }
-                    }, {
-                        'reference': {
-                            '$ne': None
-                        }
-                    }
-                ]
-            }
         }, {
             '$set': {
                 'tweet_id': '$_id',
@@ -92,6 +55,8 @@ def materialize_views():
             '$out': 'materialized_information_flow'
         }
     ])
+    db.materialized_information_flow.create_index([('focal', 1), ('date', 1)])
+    db.materialized_information_flow.create_index([('date', 1)])
 
     db.materialized_information_flow.aggregate([
         {
@@ -113,6 +78,70 @@ def materialize_views():
     ])
 
 
+def open_dump(path: str):
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    elif path.endswith('.bz2'):
+        return bz2.open(path, 'rt', encoding='utf-8')
+    elif path.endswith('.xz'):
+        return lzma.open(path, 'rt', encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def import_tweets(paths: List[str], processes: Optional[int] = None, batch_size: int = 1000) -> int:
+    from pymongo import ReplaceOne
+    from tweets import try_parse_tweet_json
+    db = get_local_database()
+    imported = 0
+    skipped = 0
+    lines_per_chunk = batch_size * (processes or os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        for path in paths:
+            with open_dump(path) as f:
+                line_number = 1
+                while True:
+                    lines = list(itertools.islice(f, lines_per_chunk))
+                    if not lines:
+                        break
+                    tweets = []
+                    for offset, (tweet, error) in enumerate(executor.map(try_parse_tweet_json, lines, chunksize=batch_size)):
+                        if error is not None:
+                            skipped += 1
+                            print(f'{path}:{line_number + offset}: skipped malformed line ({error})')
+                        elif tweet is not None:
+                            tweets.append(tweet)
+                    line_number += len(lines)
+                    for i in range(0, len(tweets), batch_size):
+                        batch = tweets[i:i + batch_size]
+                        db.tweets.bulk_write([ReplaceOne({'_id': tweet['id']}, {**tweet, '_id': tweet['id']}, upsert=True)
+                                              for tweet in batch], ordered=False)
+                        imported += len(batch)
+                    print(f'{path}: imported {imported} tweet(s) so far')
+    if skipped > 0:
+        print(f'Skipped {skipped} malformed line(s)')
+    return imported
+
+
+def migrate_tweets(batch_size: int = 1000) -> int:
+    from pymongo import ReplaceOne
+    from tweets import normalize_document
+    db = get_local_database()
+    legacy = db.tweets.find({'$or': [{'focal': {'$exists': False}},
+                                     {'references': {'$exists': False}},
+                                     {'date': {'$type': 'string'}},
+                                     {'hashtags': {'$type': 'string'}},
+                                     {'mentions': {'$type': 'string'}}]})
+    migrated = 0
+    while True:
+        batch = list(itertools.islice(legacy, batch_size))
+        if not batch:
+            break
+        db.tweets.bulk_write([ReplaceOne({'_id': doc['_id']}, normalize_document(doc)) for doc in batch], ordered=False)
+        migrated += len(batch)
+        print(f'Migrated {migrated} tweet(s) so far')
+    return migrated
+
+
 def get_reference_flows_by_focal(db):
     reference_flows = {}
     information_flow = db.materialized_information_flow.find().sort('date', 1)
@@ -129,6 +158,19 @@ def get_current_users(db):
     return list(map(lambda x: x['_id'], aggregated))
 
 
+FOCAL_PROJECTION = {'_id': 0, 'focal': 1, 'reference': 1, 'date': 1}
+FOCAL_SORT = [('date', 1), ('reference', 1)]
+
+
+@dataclass(frozen=True)
+class FocalFilter:
+    start: Optional[datetime] = None
+    end: Optional[datetime] = None
+    focals: Optional[List[EntityName]] = None
+    min_references: Optional[int] = None
+    covering: Optional[datetime] = None
+
+
 @dataclass(frozen=True)
 class ReferencePopularity:
     name: EntityName
@@ -136,25 +178,88 @@ class ReferencePopularity:
 
 
 class Database:
-    db = get_local_database()
+    @property
+    def db(self):
+        return get_local_database()
 
     @staticmethod
     def __to_reference_popularity(doc) -> ReferencePopularity:
         return ReferencePopularity(doc['_id'], doc['popularity'])
 
-    def get_focals(self) -> List[Focal]:
-        docs = self.db.materialized_information_flow.find().sort('date', 1)
+    @staticmethod
+    def __to_focals(docs) -> List[Focal]:
         result: Dict[EntityName, Focal] = {}
         for doc in docs:
             focal = doc['focal']
-            reference = doc['reference']
-            raw_date = doc['date']
-            date = raw_date if type(raw_date) == datetime else datetime.strptime(raw_date, '%Y-%m-%d %H:%M:%S')
             reference_flow = result.setdefault(focal, Focal(name=focal, timeline=[]))
-            reference_flow.timeline.append(Reference(name=reference, date=date))
+            reference_flow.timeline.append(Reference(name=doc['reference'], date=doc['date']))
             result[focal] = reference_flow
         return list(result.values())
 
+    @staticmethod
+    def __sort_focals(focals: List[Focal]) -> List[Focal]:
+        focals.sort(key=lambda focal: (focal.timeline[0].date, focal.name))
+        return focals
+
+    @staticmethod
+    def __filter_query(focal_filter: FocalFilter) -> Dict:
+        query: Dict = {}
+        if focal_filter.start is not None or focal_filter.end is not None:
+            query['date'] = {}
+            if focal_filter.start is not None:
+                query['date']['$gte'] = focal_filter.start
+            if focal_filter.end is not None:
+                query['date']['$lt'] = focal_filter.end
+        if focal_filter.focals is not None:
+            query['focal'] = {'$in': list(focal_filter.focals)}
+        return query
+
+    def __matching_focal_names(self, focal_filter: FocalFilter) -> List[EntityName]:
+        query = self.__filter_query(focal_filter)
+        if focal_filter.min_references is None and focal_filter.covering is None:
+            return sorted(self.db.materialized_information_flow.distinct('focal', query))
+        conditions: Dict = {}
+        if focal_filter.min_references is not None:
+            conditions['references'] = {'$gte': focal_filter.min_references}
+        if focal_filter.covering is not None:
+            conditions['first'] = {'$lte': focal_filter.covering}
+            conditions['last'] = {'$gte': focal_filter.covering}
+        docs = self.db.materialized_information_flow.aggregate([
+            {'$match': query},
+            {'$group': {'_id': '$focal',
+                        'references': {'$sum': 1},
+                        'first': {'$min': '$date'},
+                        'last': {'$max': '$date'}}},
+            {'$match': conditions},
+            {'$project': {'_id': 1}}
+        ])
+        return sorted(doc['_id'] for doc in docs)
+
+    def __get_partition(self, query: Dict, focal_names: List[EntityName]) -> List[Focal]:
+        docs = self.db.materialized_information_flow.find({**query, 'focal': {'$in': focal_names}}, FOCAL_PROJECTION)
+        docs = docs.sort(FOCAL_SORT)
+        return self.__to_focals(docs)
+
+    def get_focals(self, parallelism: int = 1, focal_filter: Optional[FocalFilter] = None) -> List[Focal]:
+        focal_filter = FocalFilter() if focal_filter is None else focal_filter
+        query = self.__filter_query(focal_filter)
+        if parallelism <= 1:
+            if focal_filter.min_references is not None or focal_filter.covering is not None:
+                query = {**query, 'focal': {'$in': self.__matching_focal_names(focal_filter)}}
+            docs = self.db.materialized_information_flow.find(query, FOCAL_PROJECTION).sort(FOCAL_SORT)
+            return self.__sort_focals(self.__to_focals(docs))
+        focal_names = self.__matching_focal_names(focal_filter)
+        partitions = [focal_names[i::parallelism] for i in range(parallelism)]
+        with ThreadPoolExecutor(max_workers=parallelism) as executor:
+            partitioned_focals = executor.map(lambda partition: self.__get_partition(query, partition),
+                                              [p for p in partitions if p])
+        return self.__sort_focals([focal for partition in partitioned_focals for focal in partition])
+
+    def get_materialized_version(self) -> str:
+        names = ['materialized_information_flow', 'materialized_reference_popularity']
+        collections = {info['name']: info for info in self.db.list_collections(filter={'name': {'$in': names}})}
+        return ':'.join(str(collections.get(name, {}).get('info', {}).get('uuid')) for name in names)
+
     def get_most_popular_reference(self) -> ReferencePopularity:
         docs = self.get_most_popular_references()
         return next(docs)
@@ -178,7 +283,7 @@ class Database:
             return obj
         elif hasattr(obj, '__iter__') and type(obj) is not str:
             return [Database.to_dict(v) for v in obj]
-        elif type(obj) is int or type(obj) is float or type(obj) is str or type(obj) is numpy.float64:
+        elif obj is None or type(obj) in (bool, int, str) or isinstance(obj, float):
             return obj
         else:
             return str(obj)
@@ -190,18 +295,47 @@ class Database:
         dict_results = Database.to_dict(results)
         collection.insert_many(dict_results)
 
+    def load(self, collection_name: str) -> List[Dict]:
+        return list(self.db[collection_name].find({}, {'_id': 0}))
+
     def drop(self, collection_name: str):
         collection = self.db[collection_name]
         collection.drop()
 
 
+def add_focal_filter_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--start', type=datetime.fromisoformat, help='load only references dated at or after this ISO date')
+    parser.add_argument('--end', type=datetime.fromisoformat, help='load only references dated before this ISO date')
+    parser.add_argument('--focals', nargs='+', help='load only these focals')
+    parser.add_argument('--min-references', type=int, help='load only focals with at least this many references')
+    parser.add_argument('--covering', type=datetime.fromisoformat, help='load only focals whose references span this ISO date')
+
+
+def focal_filter_from_arguments(args: argparse.Namespace) -> FocalFilter:
+    return FocalFilter(args.start, args.end, args.focals, args.min_references, args.covering)
+
+
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Manage the database.')
-    parser.add_argument('action', nargs=1, help='materialize (materialized all views dependent on tweets)')
+    parser.add_argument('action', nargs=1,
+                        help='materialize (materialized all views dependent on tweets), import (load tweets from JSONL dumps, optionally .gz/.bz2/.xz, and materialize), migrate (convert stored tweets to the normalized schema and materialize)')
+    parser.add_argument('files', nargs='*')
+    parser.add_argument('--processes', type=int, default=None, help='number of parsing processes (default: CPU count)')
+    parser.add_argument('--batch-size', type=int, default=1000, help='tweets per bulk write')
     args = parser.parse_args()
     action = args.action[0]
     if action == 'materialize':
         materialize_views()
         print('Done.')
+    elif action == 'migrate':
+        count = migrate_tweets(args.batch_size)
+        print(f'Migrated {count} tweet(s). Materializing views...')
+        materialize_views()
+        print('Done.')
+    elif action == 'import' and args.files:
+        count = import_tweets(args.files, args.processes, args.batch_size)
+        print(f'Imported {count} tweet(s). Materializing views...')
+        materialize_views()
+        print('Done.')
     else:
         parser.print_help()
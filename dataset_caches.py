@@ -0,0 +1,89 @@
+import hashlib
+import json
+import os
+import shutil
+import uuid
+from dataclasses import asdict
+from typing import Optional, Tuple, List
+
+from datasets import SklearnDataset, TimelineDataset
+
+CachedDataset = Tuple[SklearnDataset, TimelineDataset.Metrics]
+
+
+def dataset_cache_key(*parts: str) -> str:
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class DatasetCache:
+    __matrix_arrays = ('data', 'indices', 'indptr')
+
+    def __init__(self, directory: str, max_bytes: int = 2 ** 32):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def __path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    @staticmethod
+    def __size(path: str) -> int:
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+    def get(self, key: str) -> Optional[CachedDataset]:
+        import numpy
+        from scipy.sparse import csr_matrix
+        path = self.__path(key)
+        try:
+            with open(os.path.join(path, 'meta.json')) as f:
+                meta = json.load(f)
+            arrays = {name: numpy.load(os.path.join(path, f'{name}.npy'), mmap_mode='r')
+                      for name in DatasetCache.__matrix_arrays + ('y',)}
+            splits = [(numpy.load(os.path.join(path, f'train_{i}.npy'), mmap_mode='r'),
+                       numpy.load(os.path.join(path, f'test_{i}.npy'), mmap_mode='r')) for i in range(meta['splits'])]
+        except (FileNotFoundError, NotADirectoryError, ValueError):
+            return None
+        os.utime(path)
+        X = csr_matrix((arrays['data'], arrays['indices'], arrays['indptr']), shape=tuple(meta['shape']), copy=False)
+        return SklearnDataset(X, arrays['y'], splits), TimelineDataset.Metrics(**meta['metrics'])
+
+    def put(self, key: str, dataset: SklearnDataset, metrics: TimelineDataset.Metrics):
+        import numpy
+        path = self.__path(key)
+        if os.path.isdir(path):
+            os.utime(path)
+            return
+        temporary_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        os.makedirs(temporary_path)
+        X = dataset.X.tocsr()
+        for name in DatasetCache.__matrix_arrays:
+            numpy.save(os.path.join(temporary_path, f'{name}.npy'), getattr(X, name))
+        numpy.save(os.path.join(temporary_path, 'y.npy'), numpy.asarray(dataset.y))
+        for i, (train, test) in enumerate(dataset.splits):
+            numpy.save(os.path.join(temporary_path, f'train_{i}.npy'), numpy.asarray(train, dtype=numpy.int64))
+            numpy.save(os.path.join(temporary_path, f'test_{i}.npy'), numpy.asarray(test, dtype=numpy.int64))
+        with open(os.path.join(temporary_path, 'meta.json'), 'w') as f:
+            json.dump({'shape': list(X.shape), 'splits': len(dataset.splits), 'metrics': asdict(metrics)}, f)
+        try:
+            os.rename(temporary_path, path)
+        except OSError:
+            shutil.rmtree(temporary_path, ignore_errors=True)
+        self.evict()
+
+    def keys(self) -> List[str]:
+        entries = [name for name in os.listdir(self.directory)
+                   if not name.endswith('.tmp') and os.path.isdir(self.__path(name))]
+        return sorted(entries, key=lambda name: os.path.getmtime(self.__path(name)))
+
+    def size(self) -> int:
+        return sum(DatasetCache.__size(self.__path(key)) for key in self.keys())
+
+    def evict(self):
+        keys = self.keys()
+        sizes = {key: DatasetCache.__size(self.__path(key)) for key in keys}
+        total = sum(sizes.values())
+        for key in keys:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(self.__path(key), ignore_errors=True)
+            total -= sizes[key]
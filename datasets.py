@@ -1,13 +1,13 @@
 import random
 from dataclasses import dataclass
 from enum import Enum
-from typing import List, Callable, Dict, Iterator, Tuple
-
-from scipy.sparse import csr_matrix
-from sklearn.feature_extraction import DictVectorizer
+from typing import List, Callable, Dict, Iterator, Tuple, Optional, Sequence, TYPE_CHECKING, Iterable, Union
 
 from timelines import Timeline
 
+if TYPE_CHECKING:
+    from scipy.sparse import csr_matrix
+
 
 class FeatureClass(Enum):
     POSITIVE = 1
@@ -19,10 +19,19 @@ FeatureDict = Dict[FeatureName, float]
 Dicterizer = Callable[[Timeline], FeatureDict]
 
 
+class BatchDicterizer:
+    __name__: str
+
+    def __call__(self, timeline: Timeline) -> FeatureDict: ...
+
+    def transform(self, timelines: List[Timeline], vocabulary: Optional[Sequence[FeatureName]] = None) -> 'csr_matrix': ...
+
+
 class TimelineDataset:
     __x: List[Timeline]
     __y: List[FeatureClass]
     __test: List[bool]
+    __negative_sampling_rate: float
 
     @dataclass
     class Metrics:
@@ -35,23 +44,54 @@ class TimelineDataset:
         test_positive_classes: int
         test_negative_classes: int
         test_class_ratio: float
+        negative_sampling_rate: float = 1.0
 
-    def __init__(self, x: List[Timeline] = None, y: List[FeatureClass] = None, test: List[bool] = None):
+    def __init__(self, x: List[Timeline] = None, y: List[FeatureClass] = None, test: List[bool] = None,
+                 negative_sampling_rate: float = 1.0):
         self.__x = [] if x is None else x
         self.__y = [] if y is None else y
         self.__test = [] if test is None else test
+        self.__negative_sampling_rate = negative_sampling_rate
         if len(self.__x) != len(self.__y) or len(self.__x) != len(self.__test):
             raise Exception(f'len({x}) != len({y}) or len({x}) != len({test})')
 
     def __add__(self, other):
+        if self.__negative_sampling_rate != other.__negative_sampling_rate:
+            raise Exception(f'{self.__negative_sampling_rate} != {other.__negative_sampling_rate}')
         x = self.__x + other.__x
         y = self.__y + other.__y
         test = self.__test + other.__test
-        return TimelineDataset(x, y, test)
+        return TimelineDataset(x, y, test, self.__negative_sampling_rate)
+
+    def __len__(self) -> int:
+        return len(self.__y)
+
+    @staticmethod
+    def concatenate(datasets: List['TimelineDataset']) -> 'TimelineDataset':
+        result = TimelineDataset(negative_sampling_rate=datasets[0].__negative_sampling_rate if datasets else 1.0)
+        for dataset in datasets:
+            if dataset.__negative_sampling_rate != result.__negative_sampling_rate:
+                raise Exception(f'{result.__negative_sampling_rate} != {dataset.__negative_sampling_rate}')
+            result.__x.extend(dataset.__x)
+            result.__y.extend(dataset.__y)
+            result.__test.extend(dataset.__test)
+        return result
+
+    def with_negative_sampling_rate(self, negative_sampling_rate: float) -> 'TimelineDataset':
+        return TimelineDataset(self.__x, self.__y, self.__test, negative_sampling_rate)
+
+    def select(self, indices: List[int]) -> 'TimelineDataset':
+        return TimelineDataset([self.__x[i] for i in indices],
+                               [self.__y[i] for i in indices],
+                               [self.__test[i] for i in indices],
+                               self.__negative_sampling_rate)
 
     def feature_dicts(self, dicterizer: Dicterizer) -> List[FeatureDict]:
         return list(map(lambda x: dicterizer(x), self.__x))
 
+    def feature_matrix(self, dicterizer: BatchDicterizer, vocabulary: Optional[Sequence[FeatureName]] = None) -> 'csr_matrix':
+        return dicterizer.transform(self.__x, vocabulary)
+
     def feature_classes(self, shuffle: bool = False) -> List[FeatureClass]:
         result = self.__y.copy()
         if shuffle:
@@ -61,36 +101,53 @@ class TimelineDataset:
     def test_indices(self) -> List[int]:
         return [i for i, v in enumerate(self.__test) if v]
 
+    def test_flags(self) -> List[bool]:
+        return self.__test.copy()
+
+    def batches(self, batch_size: int, test: Optional[bool] = None) -> Iterator['TimelineDataset']:
+        indices = [i for i, v in enumerate(self.__test) if test is None or v == test]
+        for start in range(0, len(indices), batch_size):
+            yield self.select(indices[start:start + batch_size])
+
     def metrics(self) -> Metrics:
+        return TimelineDataset.metrics_of(self.__y, self.__test, self.__negative_sampling_rate)
+
+    @staticmethod
+    def __ratio(numerator: int, denominator: int) -> float:
+        return numerator / denominator if denominator > 0 else float('nan')
+
+    @staticmethod
+    def metrics_of(y: List[FeatureClass], test: List[bool], negative_sampling_rate: float = 1.0) -> Metrics:
         training_positive_classes = 0
         test_positive_classes = 0
         training_negative_classes = 0
         test_negative_classes = 0
         training_datasets = 0
         test_datasets = 0
-        for i, y in enumerate(self.__y):
-            if self.__test[i]:
+        for i, feature_class in enumerate(y):
+            if test[i]:
                 test_datasets += 1
-                if y == FeatureClass.POSITIVE:
+                if feature_class == FeatureClass.POSITIVE:
                     test_positive_classes += 1
                 else:
                     test_negative_classes += 1
             else:
                 training_datasets += 1
-                if y == FeatureClass.POSITIVE:
+                if feature_class == FeatureClass.POSITIVE:
                     training_positive_classes += 1
                 else:
                     training_negative_classes += 1
         return TimelineDataset.Metrics(
             training_datasets=training_datasets,
             test_datasets=test_datasets,
-            test_to_training_ratio=test_datasets / (training_datasets + test_datasets),
+            test_to_training_ratio=TimelineDataset.__ratio(test_datasets, training_datasets + test_datasets),
             training_positive_classes=training_positive_classes,
             training_negative_classes=training_negative_classes,
-            training_class_ratio=training_positive_classes / (training_positive_classes + training_negative_classes),
+            training_class_ratio=TimelineDataset.__ratio(training_positive_classes, training_datasets),
             test_positive_classes=test_positive_classes,
             test_negative_classes=test_negative_classes,
-            test_class_ratio=test_positive_classes / (test_positive_classes + test_negative_classes),
+            test_class_ratio=TimelineDataset.__ratio(test_positive_classes, test_datasets),
+            negative_sampling_rate=negative_sampling_rate,
         )
 
 
@@ -101,17 +158,64 @@ Split = Tuple[TrainIndices, TestIndices]
 
 @dataclass(frozen=True)
 class SklearnDataset:
-    X: csr_matrix
+    X: 'csr_matrix'
     y: List[int]
     splits: List[Split]
 
 
-def timeline_to_sklearn_dataset(dataset: TimelineDataset, dicterizer: Dicterizer, shuffle_classes: bool = False) -> SklearnDataset:
-    feature_dicts = dataset.feature_dicts(dicterizer)
+def timeline_to_sklearn_dataset(dataset: TimelineDataset, dicterizer: Dicterizer, shuffle_classes: bool = False,
+                                vocabulary: Optional[Sequence[FeatureName]] = None) -> SklearnDataset:
+    from sklearn.feature_extraction import DictVectorizer
     feature_classes = dataset.feature_classes(shuffle_classes)
-    vectorizer = DictVectorizer()
-    X = vectorizer.fit_transform(feature_dicts)
+    if isinstance(dicterizer, BatchDicterizer):
+        X = dataset.feature_matrix(dicterizer, vocabulary)
+    else:
+        feature_dicts = dataset.feature_dicts(dicterizer)
+        vectorizer = DictVectorizer()
+        if vocabulary is None:
+            X = vectorizer.fit_transform(feature_dicts)
+        else:
+            X = vectorizer.fit([{name: 1 for name in vocabulary}]).transform(feature_dicts)
     y = list(map(lambda x: x.value, feature_classes))
     test_indices = dataset.test_indices()
-    train_indices = [i for i in range(len(feature_dicts)) if i not in test_indices]
+    train_indices = [i for i in range(len(feature_classes)) if i not in test_indices]
     return SklearnDataset(X, y, [(train_indices, test_indices)])
+
+
+@dataclass(frozen=True)
+class SklearnBatch:
+    X: 'csr_matrix'
+    y: List[int]
+
+
+def __rebatched(datasets: Iterable[TimelineDataset], batch_size: int, test: Optional[bool]) -> Iterator[TimelineDataset]:
+    pending: List[TimelineDataset] = []
+    size = 0
+    for dataset in datasets:
+        for piece in dataset.batches(batch_size, test):
+            pending.append(piece)
+            size += len(piece)
+            if size >= batch_size:
+                combined = TimelineDataset.concatenate(pending)
+                yield combined.select(list(range(batch_size)))
+                pending = [combined.select(list(range(batch_size, size)))]
+                size -= batch_size
+    if size > 0:
+        yield TimelineDataset.concatenate(pending)
+
+
+def timeline_to_hashed_batches(dataset: Union[TimelineDataset, Iterable[TimelineDataset]], dicterizer: Dicterizer, test: bool,
+                               n_features: int = 2 ** 20, batch_size: int = 1000,
+                               vocabulary: Optional[Sequence[FeatureName]] = None) -> Iterator[SklearnBatch]:
+    from sklearn.feature_extraction import FeatureHasher
+    hasher = FeatureHasher(n_features=n_features, input_type='dict', alternate_sign=False)
+    allowed = None if vocabulary is None else set(vocabulary)
+    datasets = [dataset] if isinstance(dataset, TimelineDataset) else dataset
+    for batch in __rebatched(datasets, batch_size, test):
+        feature_dicts = batch.feature_dicts(dicterizer)
+        if allowed is not None:
+            feature_dicts = [{name: value for name, value in feature_dict.items() if name in allowed}
+                             for feature_dict in feature_dicts]
+        X = hasher.transform(feature_dicts)
+        y = list(map(lambda x: x.value, batch.feature_classes()))
+        yield SklearnBatch(X, y)
@@ -1,5 +1,12 @@
-from timelines import Timeline
-from datasets import FeatureDict
+from datetime import timedelta
+from collections import OrderedDict
+from typing import Tuple, List, Any, Optional, Sequence
+
+import numpy
+
+from focals import Focal, corpus_fingerprint
+from timelines import Timeline, EntityName
+from datasets import FeatureDict, BatchDicterizer, FeatureName
 
 
 def counting_dicterizer(timeline: Timeline) -> FeatureDict:
@@ -9,3 +16,123 @@ def counting_dicterizer(timeline: Timeline) -> FeatureDict:
         result[reference.name] = current + 1
     return result
 
+
+class WeightedDicterizer(BatchDicterizer):
+    def __init__(self, name: str):
+        self.__name__ = name
+
+    def weights(self, timelines: List[Timeline], lengths: numpy.ndarray) -> numpy.ndarray: ...
+
+    def scale(self, sums: numpy.ndarray) -> numpy.ndarray:
+        return sums
+
+    def __matrix(self, timelines: List[Timeline], vocabulary: Optional[Sequence[FeatureName]]) -> Tuple[List[FeatureName], Any]:
+        from scipy.sparse import csr_matrix
+        lengths = numpy.array([len(timeline) for timeline in timelines], dtype=numpy.int64)
+        rows = numpy.repeat(numpy.arange(len(timelines)), lengths)
+        names = [reference.name for timeline in timelines for reference in timeline]
+        if vocabulary is None:
+            unique_names, columns = numpy.unique(numpy.array(names, dtype=str), return_inverse=True)
+            feature_names = unique_names.tolist()
+        else:
+            feature_names = sorted(vocabulary)
+            indices = {name: i for i, name in enumerate(feature_names)}
+            columns = numpy.array([indices.get(name, -1) for name in names], dtype=numpy.int64)
+        weights = self.weights(timelines, lengths)
+        known = columns >= 0
+        X = csr_matrix((weights[known], (rows[known], columns[known])), shape=(len(timelines), len(feature_names)))
+        X.sum_duplicates()
+        X.data = self.scale(X.data)
+        return feature_names, X
+
+    def transform(self, timelines: List[Timeline], vocabulary: Optional[Sequence[FeatureName]] = None):
+        return self.__matrix(timelines, vocabulary)[1]
+
+    def __call__(self, timeline: Timeline) -> FeatureDict:
+        feature_names, row = self.__matrix([timeline], None)
+        return {feature_names[column]: value for column, value in zip(row.indices.tolist(), row.data.tolist())}
+
+
+class LogCountingDicterizer(WeightedDicterizer):
+    def __init__(self):
+        super().__init__('log_counting_dicterizer')
+
+    def weights(self, timelines: List[Timeline], lengths: numpy.ndarray) -> numpy.ndarray:
+        return numpy.ones(lengths.sum())
+
+    def scale(self, sums: numpy.ndarray) -> numpy.ndarray:
+        return numpy.log1p(sums)
+
+
+log_counting_dicterizer = LogCountingDicterizer()
+
+
+class DecayDicterizer(WeightedDicterizer):
+    def __init__(self, half_life: timedelta):
+        super().__init__(f'decay_dicterizer({half_life / timedelta(days=1):g})')
+        self.half_life = half_life
+
+    def weights(self, timelines: List[Timeline], lengths: numpy.ndarray) -> numpy.ndarray:
+        timestamps = numpy.array([reference.date.timestamp() for timeline in timelines for reference in timeline], dtype=float)
+        non_empty = lengths > 0
+        starts = (numpy.cumsum(lengths) - lengths)[non_empty]
+        ends = numpy.repeat(numpy.maximum.reduceat(timestamps, starts), lengths[non_empty]) if len(starts) > 0 else timestamps
+        return numpy.exp2(-(ends - timestamps) / self.half_life.total_seconds())
+
+
+def decay_dicterizer(half_life: timedelta) -> DecayDicterizer:
+    return DecayDicterizer(half_life)
+
+
+class CooccurrenceDicterizer(BatchDicterizer):
+    cache_size = 2
+    __cache: 'OrderedDict[str, Tuple[List[EntityName], Any]]' = OrderedDict()
+
+    def __init__(self, focals: List[Focal]):
+        self.__name__ = 'cooccurrence_dicterizer'
+        fingerprint = corpus_fingerprint(focals)
+        if fingerprint in CooccurrenceDicterizer.__cache:
+            CooccurrenceDicterizer.__cache.move_to_end(fingerprint)
+        else:
+            CooccurrenceDicterizer.__cache[fingerprint] = CooccurrenceDicterizer.__cooccurrences(focals)
+            while len(CooccurrenceDicterizer.__cache) > CooccurrenceDicterizer.cache_size:
+                CooccurrenceDicterizer.__cache.popitem(last=False)
+        self.__names, self.__cooccurrences = CooccurrenceDicterizer.__cache[fingerprint]
+        self.__columns = {name: i for i, name in enumerate(self.__names)}
+
+    @staticmethod
+    def __cooccurrences(focals: List[Focal]) -> Tuple[List[EntityName], Any]:
+        from scipy.sparse import csr_matrix
+        names = sorted({reference.name for focal in focals for reference in focal.timeline})
+        columns = {name: i for i, name in enumerate(names)}
+        rows = [(i, columns[name]) for i, focal in enumerate(focals)
+                for name in {reference.name for reference in focal.timeline}]
+        occurrences = csr_matrix((numpy.ones(len(rows)), ([row for row, _ in rows], [column for _, column in rows])),
+                                 shape=(len(focals), len(names)))
+        cooccurrences = (occurrences.T @ occurrences).tocsr()
+        cooccurrences.setdiag(0)
+        cooccurrences.eliminate_zeros()
+        return names, cooccurrences
+
+    def feature_names(self) -> List[FeatureName]:
+        return self.__names
+
+    def transform(self, timelines: List[Timeline], vocabulary: Optional[Sequence[FeatureName]] = None):
+        from scipy.sparse import csr_matrix
+        rows = []
+        columns = []
+        for i, timeline in enumerate(timelines):
+            for reference in timeline:
+                column = self.__columns.get(reference.name)
+                if column is not None:
+                    rows.append(i)
+                    columns.append(column)
+        counts = csr_matrix((numpy.ones(len(rows)), (rows, columns)), shape=(len(timelines), len(self.__names)))
+        X = (counts @ self.__cooccurrences).tocsr()
+        if vocabulary is not None:
+            X = X[:, [self.__columns[name] for name in sorted(vocabulary) if name in self.__columns]]
+        return X
+
+    def __call__(self, timeline: Timeline) -> FeatureDict:
+        row = self.transform([timeline])
+        return {self.__names[column]: value for column, value in zip(row.indices.tolist(), row.data.tolist())}
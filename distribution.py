@@ -1,9 +1,10 @@
+import argparse
 import csv
 from dataclasses import dataclass
 from datetime import datetime
 from typing import List
 
-from database import Database
+from database import Database, add_focal_filter_arguments, focal_filter_from_arguments
 from focals import FocalGroupSpan, Focal, DistributionPoint
 
 
@@ -22,8 +23,11 @@ def point_stats(focals: List[Focal], highest_distribution_point: DistributionPoi
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write the focal distribution over time to distribution.csv.')
+    add_focal_filter_arguments(parser)
+    args = parser.parse_args()
     database = Database()
-    focals = database.get_focals()
+    focals = database.get_focals(focal_filter=focal_filter_from_arguments(args))
     focal_group_span = FocalGroupSpan(focals)
     highest_distribution_point = focal_group_span.highest_distribution_points()[0]
     print(f'Highest distribution point: {highest_distribution_point}')
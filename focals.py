@@ -1,3 +1,4 @@
+import hashlib
 from dataclasses import dataclass
 from datetime import datetime
 from typing import Iterator, Dict, List, Set
@@ -11,6 +12,18 @@ class Focal:
     timeline: Timeline
 
 
+def focal_fingerprint(focal: Focal) -> str:
+    digest = hashlib.sha1(focal.name.encode('utf-8'))
+    for reference in focal.timeline:
+        digest.update(f'\n{reference.name}\t{reference.date.isoformat()}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def corpus_fingerprint(focals: List[Focal]) -> str:
+    fingerprints = sorted(focal_fingerprint(focal) for focal in focals)
+    return hashlib.sha1('\n'.join(fingerprints).encode('utf-8')).hexdigest()
+
+
 @dataclass(frozen=True)
 class DistributionPoint:
     timepoint: datetime
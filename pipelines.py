@@ -0,0 +1,46 @@
+import queue
+import threading
+from typing import Iterable, Iterator, TypeVar
+
+T = TypeVar('T')
+
+
+def pipelined(items: Iterable[T], depth: int) -> Iterator[T]:
+    if depth <= 0:
+        yield from items
+        return
+    buffer: queue.Queue = queue.Queue(maxsize=depth)
+    stopped = threading.Event()
+    end = object()
+
+    def put(entry) -> bool:
+        while not stopped.is_set():
+            try:
+                buffer.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((True, item)):
+                    return
+            put((True, end))
+        except BaseException as e:
+            put((False, e))
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            succeeded, item = buffer.get()
+            if not succeeded:
+                raise item
+            if item is end:
+                return
+            yield item
+    finally:
+        stopped.set()
+        producer.join()
@@ -1,8 +1,9 @@
 import collections
+import itertools
 from dataclasses import dataclass
 from datetime import datetime, timedelta
-from random import random
-from typing import Callable, List, Optional, Dict, Deque
+from random import random, Random
+from typing import Callable, List, Optional, Dict, Deque, Tuple, Iterator, Sequence, Set
 
 from focals import Focal
 from timelines import Timeline, EntityName, timeline_filter_out, timeline_split_by_timepoint, timeline_date_span, Reference
@@ -10,9 +11,23 @@ from datasets import TimelineDataset, FeatureClass
 from lists import last_index, indexes_of
 
 
+Labels = Tuple[List[FeatureClass], List[bool]]
+NegativeSelector = Callable[[], bool]
+
+
 class TimelineProcessor:
     def __call__(self, timeline: Timeline) -> TimelineDataset: ...
 
+    def labels(self, timeline: Timeline) -> Labels:
+        dataset = self(timeline)
+        return dataset.feature_classes(), dataset.test_flags()
+
+    def sample(self, timeline: Timeline, keep_negative: NegativeSelector) -> TimelineDataset:
+        dataset = self(timeline)
+        feature_classes = dataset.feature_classes()
+        return dataset.select([i for i, feature_class in enumerate(feature_classes)
+                               if feature_class == FeatureClass.POSITIVE or keep_negative()])
+
 
 @dataclass
 class FilterAndSliceToMostRecentProcessor(TimelineProcessor):
@@ -23,6 +38,11 @@ class FilterAndSliceToMostRecentProcessor(TimelineProcessor):
             return True
         return False
 
+    def labels(self, timeline: Timeline) -> Labels:
+        # The test flags are fresh coin flips, so pruning judges the split distribution rather than the exact split.
+        contains = any(reference.name == self.entity_name for reference in timeline)
+        return [FeatureClass.POSITIVE if contains else FeatureClass.NEGATIVE], [self.__flip_coin()]
+
     def __call__(self, timeline: Timeline) -> TimelineDataset:
         index = last_index(timeline, lambda reference: reference.name == self.entity_name)
         if index is None:
@@ -41,6 +61,10 @@ class TimepointProcessor(TimelineProcessor):
         contains = any(self.entity_name == r.name for r in timeline)
         return FeatureClass.POSITIVE if contains else FeatureClass.NEGATIVE
 
+    def labels(self, timeline: Timeline) -> Labels:
+        training_timeline, test_timeline = timeline_split_by_timepoint(timeline, self.timepoint)
+        return [self.__feature_class(training_timeline), self.__feature_class(test_timeline)], [False, True]
+
     def __call__(self, timeline: Timeline) -> TimelineDataset:
         training_timeline, test_timeline = timeline_split_by_timepoint(timeline, self.timepoint)
         training_class = self.__feature_class(training_timeline)
@@ -57,6 +81,16 @@ class SlicingProcessor(TimelineProcessor):
     entity_name: EntityName
     timepoint: datetime
 
+    def labels(self, timeline: Timeline) -> Labels:
+        indexes = indexes_of(timeline, lambda reference: reference.name == self.entity_name)
+        y = [FeatureClass.POSITIVE] * len(indexes)
+        test = [timeline[current].date >= self.timepoint for current in indexes]
+        last = indexes[-1] + 1 if indexes else 0
+        if last < len(timeline):
+            y.append(FeatureClass.NEGATIVE)
+            test.append(timeline[last].date >= self.timepoint)
+        return y, test
+
     def __call__(self, timeline: Timeline) -> TimelineDataset:
         indexes = indexes_of(timeline, lambda reference: reference.name == self.entity_name)
         last = 0
@@ -75,6 +109,9 @@ class SlicingProcessor(TimelineProcessor):
         return TimelineDataset(x, y, test)
 
 
+Window = Tuple[Sequence[Reference], FeatureClass, bool]
+
+
 @dataclass
 class WindowingProcessor(TimelineProcessor):
     entity_name: EntityName
@@ -82,15 +119,43 @@ class WindowingProcessor(TimelineProcessor):
     limit: timedelta
 
     def __call__(self, timeline: Timeline) -> TimelineDataset:
+        x: List[Timeline] = []
+        y: List[FeatureClass] = []
+        test: List[bool] = []
+        for bucket, feature_class, is_test in self._windows(timeline):
+            x.append(list(bucket))
+            y.append(feature_class)
+            test.append(is_test)
+        return TimelineDataset(x, y, test)
+
+    def sample(self, timeline: Timeline, keep_negative: NegativeSelector) -> TimelineDataset:
+        x: List[Timeline] = []
+        y: List[FeatureClass] = []
+        test: List[bool] = []
+        for bucket, feature_class, is_test in self._windows(timeline):
+            if feature_class == FeatureClass.POSITIVE or keep_negative():
+                x.append(list(bucket))
+                y.append(feature_class)
+                test.append(is_test)
+        return TimelineDataset(x, y, test)
+
+    def labels(self, timeline: Timeline) -> Labels:
+        y: List[FeatureClass] = []
+        test: List[bool] = []
+        for _, feature_class, is_test in self._windows(timeline):
+            y.append(feature_class)
+            test.append(is_test)
+        return y, test
+
+    def _windows(self, timeline: Timeline) -> Iterator[Window]:
         break_index = last_index(timeline, lambda reference: reference.name == self.entity_name)
-        unbounded = self._unbounded_window(timeline[break_index:]) if break_index is not None else self._unbounded_window(timeline)
         if break_index is None:
-            return unbounded
+            yield from self._unbounded_window(timeline)
         else:
-            return self._bounded_window(timeline[0:break_index]) + unbounded
+            yield from self._bounded_window(timeline[0:break_index])
+            yield from self._unbounded_window(timeline[break_index:])
 
-    def _bounded_window(self, timeline: Timeline) -> TimelineDataset:
-        result = TimelineDataset()
+    def _bounded_window(self, timeline: Timeline) -> Iterator[Window]:
         bucket: Deque[Reference] = collections.deque()
         feature_class: FeatureClass = FeatureClass.POSITIVE
         next_turnover: Optional[int] = None
@@ -107,29 +172,87 @@ class WindowingProcessor(TimelineProcessor):
                     next_turnover = i
             else:
                 if len(bucket) > 0 and bucket[-1].date - reference.date >= self.limit:
-                    result += TimelineDataset([list(bucket)], [feature_class], [self.timepoint < bucket[-1].date])
+                    yield bucket, feature_class, self.timepoint < bucket[-1].date
                     bucket.clear()
                     feature_class = FeatureClass.NEGATIVE
                     if next_turnover is not None:
                         stack = list(range(next_turnover + 1))
                         next_turnover = None
             bucket.appendleft(reference)
-        return result
 
-    def _unbounded_window(self, timeline: Timeline) -> TimelineDataset:
-        result = TimelineDataset()
+    def _unbounded_window(self, timeline: Timeline) -> Iterator[Window]:
         bucket: Timeline = []
         for reference in timeline:
             if len(bucket) > 0 and reference.date - bucket[0].date >= self.limit:
-                result += TimelineDataset([list(bucket)], [FeatureClass.NEGATIVE], [self.timepoint < reference.date])
+                yield bucket, FeatureClass.NEGATIVE, self.timepoint < reference.date
                 bucket.clear()
             bucket.append(reference)
-        return result
 
 
-def focals_to_timeline_dataset(focals: List[Focal], processor: TimelineProcessor) -> TimelineDataset:
-    result = TimelineDataset()
+@dataclass(frozen=True)
+class NegativeSampling:
+    ratio: float = 1.0
+    seed: int = 0
+
+
+@dataclass(frozen=True)
+class NegativeSelection:
+    indices: Set[int]
+    rate: float
+
+    def selector(self) -> NegativeSelector:
+        counter = itertools.count()
+        return lambda: next(counter) in self.indices
+
+
+def select_negatives(labels: List[Labels], sampling: NegativeSampling) -> NegativeSelection:
+    positives = sum(y.count(FeatureClass.POSITIVE) for y, _ in labels)
+    negatives = sum(y.count(FeatureClass.NEGATIVE) for y, _ in labels)
+    kept = min(negatives, round(sampling.ratio * positives))
+    indices = set(Random(sampling.seed).sample(range(negatives), kept))
+    return NegativeSelection(indices, kept / negatives if negatives > 0 else 1.0)
+
+
+def focals_to_timeline_datasets(focals: List[Focal], processor: TimelineProcessor,
+                                sampling: Optional[NegativeSampling] = None) -> Iterator[TimelineDataset]:
+    if sampling is None:
+        for focal in focals:
+            yield processor(focal.timeline)
+        return
+    selection = select_negatives([processor.labels(focal.timeline) for focal in focals], sampling)
+    keep_negative = selection.selector()
     for focal in focals:
-        dataset = processor(focal.timeline)
-        result += dataset
-    return result
+        yield processor.sample(focal.timeline, keep_negative).with_negative_sampling_rate(selection.rate)
+
+
+def focals_to_timeline_dataset(focals: List[Focal], processor: TimelineProcessor,
+                               sampling: Optional[NegativeSampling] = None) -> TimelineDataset:
+    return TimelineDataset.concatenate(list(focals_to_timeline_datasets(focals, processor, sampling)))
+
+
+@dataclass(frozen=True)
+class FocalDatasets:
+    focals: List[Focal]
+    processor: TimelineProcessor
+    sampling: Optional[NegativeSampling] = None
+
+    def __iter__(self) -> Iterator[TimelineDataset]:
+        return focals_to_timeline_datasets(self.focals, self.processor, self.sampling)
+
+    def metrics(self) -> TimelineDataset.Metrics:
+        return focals_to_metrics(self.focals, self.processor, self.sampling)
+
+
+def focals_to_metrics(focals: List[Focal], processor: TimelineProcessor,
+                      sampling: Optional[NegativeSampling] = None) -> TimelineDataset.Metrics:
+    labels = [processor.labels(focal.timeline) for focal in focals]
+    selection = None if sampling is None else select_negatives(labels, sampling)
+    keep_negative = None if selection is None else selection.selector()
+    y: List[FeatureClass] = []
+    test: List[bool] = []
+    for focal_y, focal_test in labels:
+        for feature_class, is_test in zip(focal_y, focal_test):
+            if keep_negative is None or feature_class == FeatureClass.POSITIVE or keep_negative():
+                y.append(feature_class)
+                test.append(is_test)
+    return TimelineDataset.metrics_of(y, test, 1.0 if selection is None else selection.rate)
@@ -0,0 +1,178 @@
+import argparse
+import json
+import threading
+from dataclasses import dataclass, field
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import List, Optional
+
+from benchmark import resolve_dicterizer, known_dicterizer, CLASSIFIERS, FilteredBenchmarkResults, filter, prune, benchmark, report, to_json
+from database import Database, ReferencePopularity
+from focals import Focal, FocalGroupSpan, DistributionPoint
+from processors import TimelineProcessor, WindowingProcessor, TimepointProcessor, SlicingProcessor, FilterAndSliceToMostRecentProcessor, \
+    NegativeSampling
+
+
+@dataclass
+class Corpus:
+    version: str
+    focals: List[Focal]
+    highest_distribution_point: DistributionPoint
+    references: List[ReferencePopularity]
+
+
+def load_corpus(database: Database, references: int, load_parallelism: int = 1) -> Corpus:
+    version = database.get_materialized_version()
+    focals = database.get_focals(load_parallelism)
+    highest_distribution_point = FocalGroupSpan(focals).highest_distribution_points()[0]
+    most_popular_references = database.get_most_popular_references()
+    return Corpus(version=version,
+                  focals=focals,
+                  highest_distribution_point=highest_distribution_point,
+                  references=[reference for _, reference in zip(range(references), most_popular_references)])
+
+
+@dataclass
+class JobSpec:
+    processor: str = 'WindowingProcessor'
+    references: int = 1000
+    weeks: List[int] = field(default_factory=lambda: [8, 16, 24])
+    dicterizers: List[str] = field(default_factory=lambda: ['counting_dicterizer'])
+    classifiers: List[str] = field(default_factory=lambda: ['decision_tree_classifier'])
+    test_to_training_min_value: float = 0.2
+    test_class_ratio_max_divergence: float = 0.2
+    prune: bool = True
+    save: bool = False
+    negative_ratio: Optional[float] = None
+    sampling_seed: int = NegativeSampling.seed
+
+
+def job_processors(spec: JobSpec, corpus: Corpus) -> List[TimelineProcessor]:
+    if spec.references > len(corpus.references):
+        raise ValueError(f'Only {len(corpus.references)} references are loaded, {spec.references} requested')
+    entity_names = [reference.name for reference in corpus.references[:spec.references]]
+    timepoint = corpus.highest_distribution_point.timepoint
+    if spec.processor == 'WindowingProcessor':
+        return [WindowingProcessor(entity_name, timepoint, timedelta(weeks=weeks)) for entity_name in entity_names for weeks in spec.weeks]
+    elif spec.processor == 'TimepointProcessor':
+        return [TimepointProcessor(entity_name, timepoint) for entity_name in entity_names]
+    elif spec.processor == 'SlicingProcessor':
+        return [SlicingProcessor(entity_name, timepoint) for entity_name in entity_names]
+    elif spec.processor == 'FilterAndSliceToMostRecentProcessor':
+        return [FilterAndSliceToMostRecentProcessor(entity_name) for entity_name in entity_names]
+    raise ValueError(f'Unknown processor: {spec.processor}')
+
+
+class InvalidJob(ValueError):
+    pass
+
+
+def validate_job(spec: JobSpec, corpus: Corpus):
+    try:
+        job_processors(spec, corpus)
+    except ValueError as e:
+        raise InvalidJob(str(e))
+    if any(weeks <= 0 for weeks in spec.weeks):
+        raise InvalidJob(f'Weeks must be positive: {spec.weeks}')
+    unknown = [name for name in spec.dicterizers if not known_dicterizer(name)] + \
+        [name for name in spec.classifiers if name not in CLASSIFIERS]
+    if unknown:
+        raise InvalidJob(f'Unknown dicterizers or classifiers: {unknown}')
+    if spec.negative_ratio is not None and spec.negative_ratio <= 0:
+        raise InvalidJob(f'Negative ratio must be positive: {spec.negative_ratio}')
+
+
+def run_job(corpus: Corpus, spec: JobSpec, database: Optional[Database] = None) -> FilteredBenchmarkResults:
+    processors = job_processors(spec, corpus)
+    dicterizers = [resolve_dicterizer(name, corpus.focals) for name in spec.dicterizers]
+    classifier_factories = [CLASSIFIERS[name] for name in spec.classifiers]
+    sampling = None if spec.negative_ratio is None else NegativeSampling(spec.negative_ratio, spec.sampling_seed)
+    if spec.prune:
+        processors = prune(corpus.focals, processors, spec.test_to_training_min_value, spec.test_class_ratio_max_divergence,
+                           sampling).accepted
+    results = benchmark(corpus.focals, processors, dicterizers, classifier_factories, sampling=sampling)
+    filtered_results = filter(results, spec.test_to_training_min_value, spec.test_class_ratio_max_divergence)
+    if spec.save and database is not None:
+        report(database, results, filtered_results)
+    return filtered_results
+
+
+class BenchmarkService:
+    def __init__(self, database: Database, references: int, load_parallelism: int = 1):
+        self.database = database
+        self.references = references
+        self.load_parallelism = load_parallelism
+        self.lock = threading.Lock()
+        self.corpus = load_corpus(database, references, load_parallelism)
+
+    def refresh(self) -> bool:
+        if self.database.get_materialized_version() == self.corpus.version:
+            return False
+        self.corpus = load_corpus(self.database, self.references, self.load_parallelism)
+        return True
+
+    def status(self) -> dict:
+        return {'version': self.corpus.version,
+                'focals': len(self.corpus.focals),
+                'references': len(self.corpus.references),
+                'highest_distribution_point': str(self.corpus.highest_distribution_point)}
+
+    def submit(self, spec: JobSpec) -> FilteredBenchmarkResults:
+        with self.lock:
+            if self.refresh():
+                print(f'Materialized views changed, corpus reloaded ({self.corpus.version})')
+            validate_job(spec, self.corpus)
+            return run_job(self.corpus, spec, self.database)
+
+
+def handler_for(service: BenchmarkService):
+    class Handler(BaseHTTPRequestHandler):
+        def __respond(self, status: int, body: str):
+            encoded = body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(encoded)))
+            self.end_headers()
+            self.wfile.write(encoded)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self.__respond(200, json.dumps(service.status()))
+            else:
+                self.__respond(404, json.dumps({'error': f'Unknown path: {self.path}'}))
+
+        def do_POST(self):
+            if self.path != '/jobs':
+                self.__respond(404, json.dumps({'error': f'Unknown path: {self.path}'}))
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                spec = JobSpec(**json.loads(self.rfile.read(length) or b'{}'))
+            except (TypeError, ValueError) as e:
+                self.__respond(400, json.dumps({'error': str(e)}))
+                return
+            try:
+                results = service.submit(spec)
+            except InvalidJob as e:
+                self.__respond(400, json.dumps({'error': str(e)}))
+                return
+            except Exception as e:
+                self.__respond(500, json.dumps({'error': f'{type(e).__name__}: {e}'}))
+                return
+            self.__respond(200, to_json(results))
+
+    return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve benchmark jobs over a corpus kept in memory.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8017)
+    parser.add_argument('--references', type=int, default=1000, help='number of most popular references kept in memory')
+    parser.add_argument('--load-parallelism', type=int, default=1, help='number of focal partitions loaded concurrently')
+    args = parser.parse_args()
+    service = BenchmarkService(Database(), args.references, args.load_parallelism)
+    print(f'Corpus loaded: {service.status()}')
+    server = HTTPServer((args.host, args.port), handler_for(service))
+    print(f'Listening on http://{args.host}:{args.port} (GET /status, POST /jobs)')
+    server.serve_forever()
@@ -0,0 +1,102 @@
+import bisect
+import json
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 60, 300)
+
+
+class Histogram:
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative_counts(self) -> List[int]:
+        result = []
+        total = 0
+        for count in self.counts:
+            total += count
+            result.append(total)
+        return result
+
+
+class Telemetry:
+    def __init__(self, prefix: str, log_path: Optional[str] = None, metrics_path: Optional[str] = None,
+                 metrics_interval: float = 10):
+        self.prefix = prefix
+        self.log_path = log_path
+        self.metrics_path = metrics_path
+        self.metrics_interval = metrics_interval
+        self.counters: Dict[str, float] = {}
+        self.gauges: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.started = time.monotonic()
+        self.metrics_written: Optional[float] = None
+        self.__log_file = None
+
+    def increment(self, name: str, value: float = 1):
+        self.counters[name] = self.counters.get(name, 0) + value
+        self.__maybe_write_metrics()
+
+    def set(self, name: str, value: float):
+        self.gauges[name] = value
+        self.__maybe_write_metrics()
+
+    def observe(self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.histograms.setdefault(name, Histogram(buckets)).observe(value)
+        self.__maybe_write_metrics()
+
+    def rate(self, counter: str) -> float:
+        elapsed = time.monotonic() - self.started
+        return self.counters.get(counter, 0) / elapsed if elapsed > 0 else 0.0
+
+    def event(self, name: str, **fields):
+        if self.log_path is None:
+            return
+        if self.__log_file is None or self.__log_file.name != self.log_path:
+            self.close()
+            self.__log_file = open(self.log_path, 'a')
+        self.__log_file.write(json.dumps({'time': datetime.now().isoformat(), 'event': name, **fields}, default=str) + '\n')
+        self.__log_file.flush()
+
+    def close(self):
+        if self.__log_file is not None:
+            self.__log_file.close()
+            self.__log_file = None
+
+    def __maybe_write_metrics(self):
+        now = time.monotonic()
+        if self.metrics_written is None or now - self.metrics_written >= self.metrics_interval:
+            self.write_metrics()
+
+    def write_metrics(self):
+        self.metrics_written = time.monotonic()
+        if self.metrics_path is None:
+            return
+        lines = []
+        for name, value in sorted(self.counters.items()):
+            lines += [f'# TYPE {self.prefix}_{name} counter', f'{self.prefix}_{name} {value}']
+        for name, value in sorted(self.gauges.items()):
+            lines += [f'# TYPE {self.prefix}_{name} gauge', f'{self.prefix}_{name} {value}']
+        for name, histogram in sorted(self.histograms.items()):
+            lines.append(f'# TYPE {self.prefix}_{name} histogram')
+            for bound, count in zip(self.buckets_labels(histogram), histogram.cumulative_counts()):
+                lines.append(f'{self.prefix}_{name}_bucket{{le="{bound}"}} {count}')
+            lines += [f'{self.prefix}_{name}_sum {histogram.sum}', f'{self.prefix}_{name}_count {histogram.count}']
+        temporary_path = self.metrics_path + '.tmp'
+        with open(temporary_path, 'w') as f:
+            f.write('\n'.join(lines) + '\n')
+        os.replace(temporary_path, self.metrics_path)
+
+    @staticmethod
+    def buckets_labels(histogram: Histogram) -> List[str]:
+        return [str(bound) for bound in histogram.buckets] + ['+Inf']
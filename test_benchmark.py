@@ -0,0 +1,270 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from datetime import timedelta
+
+import pytest
+from sklearn.linear_model import SGDClassifier
+
+import benchmark as benchmark_module
+from benchmark import streaming_scores, StreamingMode, prune, benchmark_tasks, work, decision_tree_classifier, sgd_classifier, \
+    benchmark, TimeBudget, filter, BenchmarkResult, successive_halving, halving_fractions, dataset_fingerprint, wait_for_results, \
+    resolve_dicterizer, known_dicterizer
+from dataset_caches import DatasetCache
+from database import Database
+from datasets import TimelineDataset, FeatureClass
+from dicterizers import counting_dicterizer, decay_dicterizer, CooccurrenceDicterizer
+from focals import Focal, focal_fingerprint
+from processors import TimepointProcessor, SlicingProcessor
+from test_utils import now, day
+from timelines import Reference
+from work_queues import LocalTaskQueue
+
+
+focal_a = Focal('Focal_A', [Reference('Reference_A', day[1]),
+                            Reference('Reference_X', day[2]),
+                            Reference('Reference_B', day[3]),
+                            Reference('Reference_X', day[4])])
+focal_b = Focal('Focal_B', [Reference('Reference_B', day[1]),
+                            Reference('Reference_C', day[3])])
+focals = [focal_a, focal_b]
+
+halving_focals = [Focal(f'Focal_{i}', (focal_a if i % 2 == 0 else focal_b).timeline) for i in range(8)]
+
+
+def test_streaming_scores():
+    positive = [Reference('Reference_A', now)]
+    negative = [Reference('Reference_B', now)]
+    dataset = TimelineDataset([positive, negative] * 4 + [positive, negative],
+                              [FeatureClass.POSITIVE, FeatureClass.NEGATIVE] * 5,
+                              [False] * 8 + [True] * 2)
+    scores = streaming_scores(SGDClassifier(random_state=0), dataset, counting_dicterizer, StreamingMode(n_features=16, batch_size=3))
+    assert scores == [1.0]
+    training_only = TimelineDataset([positive, negative], [FeatureClass.POSITIVE, FeatureClass.NEGATIVE], [False, False])
+    scores = streaming_scores(SGDClassifier(random_state=0), training_only, counting_dicterizer, StreamingMode(n_features=16))
+    assert math.isnan(scores[0])
+
+
+def test_prune():
+    balanced = TimepointProcessor('Reference_X', day[3])
+    only_training = TimepointProcessor('Reference_X', day[9])
+    result = prune([focal_a], [balanced, only_training], 0.2, 0.2)
+    assert result.accepted == []
+    assert result.pruned == [balanced, only_training]
+    result = prune([focal_a], [balanced], 0.2, 0.5)
+    assert result.accepted == [balanced]
+
+
+def test_work():
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    queue = LocalTaskQueue()
+    queue.enqueue(benchmark_tasks(processors, [counting_dicterizer], [decision_tree_classifier, sgd_classifier]))
+    assert work(focals, queue, 'worker', timedelta(hours=1)) == 4
+    results = queue.results()
+    assert [result.processor['entity_name'] for result in results] == ['Reference_X', 'Reference_X', 'Reference_B', 'Reference_B']
+    assert [result.classifier for result in results] == ['DecisionTreeClassifier()', 'SGDClassifier()'] * 2
+
+
+def test_work_waits_for_the_coordinator():
+    queue = LocalTaskQueue()
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        done = executor.submit(work, focals, queue, 'worker', timedelta(hours=1), 0.01)
+        time.sleep(0.1)
+        assert not done.done()
+        queue.enqueue(benchmark_tasks([TimepointProcessor('Reference_X', day[3])], [counting_dicterizer], [decision_tree_classifier]))
+        assert done.result(timeout=10) == 1
+    assert len(wait_for_results(queue)) == 1
+    assert not queue.is_open()
+
+
+def test_idle_worker_exits_when_the_run_closes():
+    queue = LocalTaskQueue()
+    queue.enqueue(benchmark_tasks([TimepointProcessor('Reference_X', day[3])], [counting_dicterizer], [decision_tree_classifier]))
+    queue.claim('other', timedelta(hours=1))
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        done = executor.submit(work, focals, queue, 'worker', timedelta(hours=1), 0.01)
+        time.sleep(0.1)
+        assert not done.done()
+        queue.close()
+        assert done.result(timeout=10) == 0
+
+
+def test_benchmark_time_budget():
+    processors = [TimepointProcessor('Reference_X', day[3])]
+    results = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier], budget=TimeBudget(iteration=30))
+    assert not results[0].timed_out
+    assert len(results[0].scores) == 1
+    results = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier], budget=TimeBudget(run=0))
+    assert results[0].timed_out
+    assert results[0].scores == []
+    assert filter(results, 0, 1).off_limits == results
+
+
+def test_benchmark_run_budget_skips_dataset_preparation(monkeypatch):
+    def focals_to_timeline_dataset(*args):
+        raise AssertionError('dataset prepared after the run budget was used up')
+
+    monkeypatch.setattr(benchmark_module, 'focals_to_timeline_dataset', focals_to_timeline_dataset)
+    processors = [TimepointProcessor('Reference_X', day[i]) for i in range(1, 6)]
+    results = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier], budget=TimeBudget(run=0),
+                        previous_results=[])
+    assert len(results) == 5
+    assert all(result.timed_out and result.scores == [] for result in results)
+    assert filter(results, 0, 1).off_limits == results
+
+
+def test_benchmark_refresh():
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    assert benchmark([focal_a, focal_b], processors, [counting_dicterizer], [decision_tree_classifier])[0].fingerprint is None
+    first = benchmark([focal_a, focal_b], processors, [counting_dicterizer], [decision_tree_classifier], previous_results=[])
+    stored = [BenchmarkResult.from_dict(Database.to_dict(result)) for result in first]
+    assert [result.fingerprint for result in stored] == [result.fingerprint for result in first]
+    unchanged = benchmark([focal_a, focal_b], processors, [counting_dicterizer], [decision_tree_classifier],
+                          previous_results=stored)
+    assert all(a is b for a, b in zip(unchanged, stored))
+    focal_c = Focal('Focal_C', [Reference('Reference_D', day[1])])
+    changed = benchmark([focal_a, focal_b, focal_c], processors, [counting_dicterizer], [decision_tree_classifier],
+                        previous_results=stored)
+    assert not any(a is b for a, b in zip(changed, stored))
+    focal_fingerprints = {focal.name: focal_fingerprint(focal) for focal in [focal_a, focal_b]}
+    assert dataset_fingerprint([focal_a, focal_b], processors[0], focal_fingerprints, streaming=StreamingMode()) != \
+        dataset_fingerprint([focal_a, focal_b], processors[0], focal_fingerprints)
+
+
+def test_benchmark_refresh_reruns_failures_and_corpus_changes():
+    processors = [SlicingProcessor('Reference_X', day[3])]
+    dicterizers = [counting_dicterizer, CooccurrenceDicterizer(focals)]
+    first = benchmark(focals, processors, dicterizers, [decision_tree_classifier], previous_results=[])
+    failed = [replace(first[0], error='failed'), first[1]]
+    assert [a is b for a, b in zip(benchmark(focals, processors, dicterizers, [decision_tree_classifier], previous_results=failed),
+                                   failed)] == [False, True]
+    unlabeled = Focal('Focal_C', [])
+    assert not processors[0].labels(unlabeled.timeline)[0]
+    grown = focals + [unlabeled]
+    rerun = benchmark(grown, processors, [counting_dicterizer, CooccurrenceDicterizer(grown)], [decision_tree_classifier],
+                      previous_results=first)
+    assert [a is b for a, b in zip(rerun, first)] == [True, False]
+
+
+def test_benchmark_pipelined():
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    sequential = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier])
+    pipelined = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier], pipeline_depth=1)
+    assert [(r.processor, r.fingerprint, r.metrics) for r in pipelined] == [(r.processor, r.fingerprint, r.metrics) for r in sequential]
+
+
+def test_halving_fractions():
+    assert halving_fractions(0.25, 0.5) == [0.25, 0.5, 1.0]
+    assert halving_fractions(0.3, 0.5) == [0.3, 0.6, 1.0]
+    assert halving_fractions(1.0, 0.5) == [1.0]
+    for min_fraction, keep in [(0, 0.5), (1.5, 0.5), (0.5, 0), (0.5, 1), (0.5, 2)]:
+        with pytest.raises(ValueError):
+            halving_fractions(min_fraction, keep)
+
+
+def test_successive_halving():
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    search = successive_halving(halving_focals, processors, [counting_dicterizer], [decision_tree_classifier, sgd_classifier], 0, 1,
+                                min_fraction=0.25, keep=0.5, seed=1)
+    assert [r.focals for r in search.rounds] == [2, 4, 8]
+    assert [r.configurations for r in search.rounds] == [4, 2, 1]
+    assert [r.promoted for r in search.rounds] == [2, 1, 1]
+    assert search.results == search.rounds[-1].results
+    assert len(search.results) == 1
+    assert search.results[0].processor == search.rounds[1].results[0].processor
+
+
+def test_successive_halving_ranks_nan_scores_last(monkeypatch):
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    run = benchmark_module.run
+
+    def nan_scoring_run(processor, *args):
+        result = run(processor, *args)
+        return replace(result, score_avg=math.nan) if processor.entity_name == 'Reference_X' else result
+
+    monkeypatch.setattr(benchmark_module, 'run', nan_scoring_run)
+    search = successive_halving(halving_focals, processors, [counting_dicterizer], [decision_tree_classifier], 0, 1,
+                                min_fraction=0.5, keep=0.5)
+    assert [r.processor['entity_name'] for r in search.results] == ['Reference_B']
+
+
+def test_benchmark_dataset_cache(tmp_path, monkeypatch):
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    cache = DatasetCache(str(tmp_path))
+
+    def dataset_fingerprint(*args):
+        raise AssertionError('dataset fingerprinted although only the cache is used')
+
+    monkeypatch.setattr(benchmark_module, 'dataset_fingerprint', dataset_fingerprint)
+    first = benchmark(focals, processors, [counting_dicterizer], [decision_tree_classifier], cache=cache)
+    assert len(cache.keys()) == 2
+
+    def focals_to_timeline_dataset(*args):
+        raise AssertionError('dataset prepared although it is cached')
+
+    monkeypatch.setattr(benchmark_module, 'focals_to_timeline_dataset', focals_to_timeline_dataset)
+    second = benchmark(focals, processors, [counting_dicterizer], [sgd_classifier], cache=cache)
+    assert [(r.processor, r.metrics) for r in second] == [(r.processor, r.metrics) for r in first]
+    with pytest.raises(AssertionError, match='although it is cached'):
+        benchmark(focals + [Focal('Focal_C', [Reference('Reference_D', day[1])])], processors[:1], [counting_dicterizer],
+                  [decision_tree_classifier], cache=cache)
+
+
+def test_benchmark_time_budget_covers_vectorization(monkeypatch):
+
+    def slow_vectorization(*args, **kwargs):
+        time.sleep(5)
+
+    def pipelined(items, depth):
+        assert depth == 0
+        return items
+
+    monkeypatch.setattr(benchmark_module, 'timeline_to_sklearn_dataset', slow_vectorization)
+    monkeypatch.setattr(benchmark_module, 'pipelined', pipelined)
+    results = benchmark(focals, [TimepointProcessor('Reference_X', day[3])], [counting_dicterizer], [decision_tree_classifier],
+                        budget=TimeBudget(iteration=0.5), pipeline_depth=1)
+    assert results[0].timed_out
+
+
+def test_benchmark_streaming(monkeypatch):
+
+    def focals_to_timeline_dataset(*args):
+        raise AssertionError('whole dataset built in streaming mode')
+
+    monkeypatch.setattr(benchmark_module, 'focals_to_timeline_dataset', focals_to_timeline_dataset)
+    results = benchmark(focals, [TimepointProcessor('Reference_X', day[3])], [counting_dicterizer], [sgd_classifier],
+                        streaming=StreamingMode(n_features=16, batch_size=1))
+    assert len(results[0].scores) == 1
+    assert results[0].metrics.training_datasets == 2
+
+
+def test_successive_halving_records_failures_and_builds_each_dataset_once(monkeypatch):
+    processors = [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_Z', day[3])]
+    built = []
+    focals_to_timeline_dataset = benchmark_module.focals_to_timeline_dataset
+
+    def counting_focals_to_timeline_dataset(focals, processor, sampling=None):
+        built.append(processor.entity_name)
+        return focals_to_timeline_dataset(focals, processor, sampling)
+
+    monkeypatch.setattr(benchmark_module, 'focals_to_timeline_dataset', counting_focals_to_timeline_dataset)
+    search = successive_halving(halving_focals, processors, [counting_dicterizer], [sgd_classifier, decision_tree_classifier], 0, 1,
+                                min_fraction=0.5, keep=0.75)
+    assert len(search.rounds) == 4
+    assert len(built) == sum(len({r.processor['entity_name'] for r in halving_round.results}) for halving_round in search.rounds)
+    first_round = search.rounds[0].results
+    failed = [result for result in first_round if result.error is not None]
+    assert len(failed) == 1 and failed[0].processor['entity_name'] == 'Reference_Z'
+    assert first_round[-1] is failed[0]
+    assert failed[0] in filter(first_round, 0, 1).off_limits
+
+
+def test_resolve_decay_dicterizer():
+    dicterizer = decay_dicterizer(timedelta(days=7))
+    resolved = resolve_dicterizer(dicterizer.__name__, [])
+    assert resolved.__name__ == 'decay_dicterizer(7)'
+    timeline = [Reference('Reference_A', day[1]), Reference('Reference_B', day[8])]
+    assert resolved(timeline) == dicterizer(timeline)
+    assert known_dicterizer('decay_dicterizer(0.5)')
+    assert not known_dicterizer('decay_dicterizer()')
@@ -0,0 +1,190 @@
+import argparse
+import contextlib
+import gzip
+import json
+import subprocess
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from focals import Focal
+from timelines import Reference
+from database import Database, get_client, open_dump, FocalFilter, add_focal_filter_arguments, focal_filter_from_arguments
+
+
+def loaded_modules(statement: str):
+    code = f'import sys; {statement}; print(" ".join(sys.modules))'
+    output = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True).stdout
+    return set(output.split())
+
+
+def test_lightweight_imports_do_not_load_heavy_dependencies():
+    modules = loaded_modules('import database, distribution, user_collector, benchmark')
+    assert not {'pymongo', 'sklearn', 'scipy', 'snscrape'} & modules
+
+
+def test_database_connects_lazily():
+    modules = loaded_modules('import database; database.Database()')
+    assert 'pymongo' not in modules
+
+
+def test_client_is_shared():
+    assert get_client() is get_client()
+    assert Database().db.client is Database().db.client
+
+
+def test_open_dump(tmp_path):
+    plain = tmp_path / 'tweets.jsonl'
+    plain.write_text('{"id": "1"}\n')
+    compressed = tmp_path / 'tweets.jsonl.gz'
+    with gzip.open(compressed, 'wt') as f:
+        f.write('{"id": "1"}\n')
+    for path in (plain, compressed):
+        with open_dump(str(path)) as f:
+            assert f.readlines() == ['{"id": "1"}\n']
+
+
+def test_import_tweets_reads_in_bounded_chunks(monkeypatch):
+    lines = [json.dumps({'id': str(i), 'username': 'user', 'date': '2021-03-04 05:06:07'}) + '\n' for i in range(23)] + ['\n']
+    read = []
+    written = []
+
+    def dump():
+        for line in lines:
+            read.append(line)
+            yield line
+
+    class Tweets:
+        def bulk_write(self, requests, ordered):
+            written.append((len(read), len(requests)))
+
+    monkeypatch.setattr(database, 'get_local_database', lambda: SimpleNamespace(tweets=Tweets()))
+    monkeypatch.setattr(database, 'open_dump', lambda path: contextlib.nullcontext(dump()))
+    assert database.import_tweets(['tweets.jsonl'], processes=2, batch_size=5) == 23
+    assert written == [(10, 5), (10, 5), (20, 5), (20, 5), (24, 3)]
+
+
+def test_import_tweets_skips_malformed_lines(monkeypatch, capsys):
+    lines = [json.dumps({'id': '1', 'username': 'user', 'date': '2021-03-04 05:06:07'}) + '\n', '{"id": \n',
+             json.dumps({'id': '2', 'username': 'user', 'date': '2021-03-04 05:06:07'}) + '\n']
+    written = []
+
+    class Tweets:
+        def bulk_write(self, requests, ordered):
+            written.append(len(requests))
+
+    monkeypatch.setattr(database, 'get_local_database', lambda: SimpleNamespace(tweets=Tweets()))
+    monkeypatch.setattr(database, 'open_dump', lambda path: contextlib.nullcontext(iter(lines)))
+    assert database.import_tweets(['tweets.jsonl'], processes=1, batch_size=2) == 2
+    assert written == [1, 1]
+    output = capsys.readouterr().out
+    assert 'tweets.jsonl:2: skipped malformed line' in output
+    assert 'Skipped 1 malformed line(s)' in output
+
+
+def test_focal_filter_from_arguments():
+    parser = argparse.ArgumentParser()
+    add_focal_filter_arguments(parser)
+    args = parser.parse_args(['--start', '2020-01-01', '--focals', '@a', '@b', '--min-references', '5',
+                              '--covering', '2020-06-01T12:00:00'])
+    assert focal_filter_from_arguments(args) == FocalFilter(start=datetime(2020, 1, 1), focals=['@a', '@b'], min_references=5,
+                                                            covering=datetime(2020, 6, 1, 12))
+    assert focal_filter_from_arguments(parser.parse_args([])) == FocalFilter()
+
+
+def matches(doc: dict, query: dict) -> bool:
+    for field, condition in query.items():
+        value = doc.get(field)
+        if not isinstance(condition, dict):
+            condition = {'$eq': condition}
+        for operator, operand in condition.items():
+            if not {'$eq': lambda: value == operand,
+                    '$in': lambda: value in operand,
+                    '$gte': lambda: value >= operand,
+                    '$lte': lambda: value <= operand,
+                    '$lt': lambda: value < operand}[operator]():
+                return False
+    return True
+
+
+class Cursor(list):
+    def sort(self, keys):
+        for field, direction in reversed(keys):
+            super().sort(key=lambda doc: doc[field], reverse=direction < 0)
+        return self
+
+
+class Collection:
+    def __init__(self, docs):
+        self.docs = docs
+        self.pipelines = []
+
+    def find(self, query, projection=None):
+        return Cursor(doc for doc in self.docs if matches(doc, query))
+
+    def distinct(self, field, query):
+        return list({doc[field] for doc in self.docs if matches(doc, query)})
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        groups = {}
+        for doc in self.docs:
+            if matches(doc, pipeline[0]['$match']):
+                group = groups.setdefault(doc['focal'], {'_id': doc['focal'], 'references': 0, 'first': doc['date'], 'last': doc['date']})
+                group['references'] += 1
+                group['first'] = min(group['first'], doc['date'])
+                group['last'] = max(group['last'], doc['date'])
+        return [{'_id': group['_id']} for group in groups.values() if matches(group, pipeline[2]['$match'])]
+
+
+flows = [{'focal': focal, 'reference': reference, 'date': datetime(2020, 1, day)} for focal, reference, day in
+         [('@c', '#b', 1), ('@b', '#a', 2), ('@a', '#x', 1), ('@c', '#a', 1), ('@b', '#y', 5), ('@d', '#z', 9), ('@a', '#y', 3)]]
+
+
+def stub_database(monkeypatch) -> Collection:
+    collection = Collection(flows)
+    monkeypatch.setattr(database, 'get_local_database', lambda: SimpleNamespace(materialized_information_flow=collection))
+    return collection
+
+
+def test_get_focals_parallel_matches_serial(monkeypatch):
+    stub_database(monkeypatch)
+    serial = Database().get_focals()
+    assert [focal.name for focal in serial] == ['@a', '@c', '@b', '@d']
+    assert serial[1] == Focal('@c', [Reference('#a', datetime(2020, 1, 1)), Reference('#b', datetime(2020, 1, 1))])
+    for parallelism in (2, 3, 4):
+        assert Database().get_focals(parallelism) == serial
+
+
+def test_filter_query():
+    filter_query = Database._Database__filter_query
+    assert filter_query(FocalFilter()) == {}
+    assert filter_query(FocalFilter(start=datetime(2020, 1, 2), end=datetime(2020, 1, 5), focals=['@a'])) == \
+        {'date': {'$gte': datetime(2020, 1, 2), '$lt': datetime(2020, 1, 5)}, 'focal': {'$in': ['@a']}}
+    assert filter_query(FocalFilter(end=datetime(2020, 1, 5))) == {'date': {'$lt': datetime(2020, 1, 5)}}
+
+
+def test_get_focals_pushes_filters_into_the_query(monkeypatch):
+    collection = stub_database(monkeypatch)
+    focals = Database().get_focals(focal_filter=FocalFilter(start=datetime(2020, 1, 2), focals=['@a', '@b']))
+    assert [(focal.name, [reference.name for reference in focal.timeline]) for focal in focals] == [('@b', ['#a', '#y']), ('@a', ['#y'])]
+    assert collection.pipelines == []
+    focal_filter = FocalFilter(end=datetime(2020, 1, 6), min_references=2, covering=datetime(2020, 1, 2))
+    for parallelism in (1, 2):
+        focals = Database().get_focals(parallelism, focal_filter)
+        assert [focal.name for focal in focals] == ['@a', '@b']
+    assert collection.pipelines[0] == [
+        {'$match': {'date': {'$lt': datetime(2020, 1, 6)}}},
+        {'$group': {'_id': '$focal', 'references': {'$sum': 1}, 'first': {'$min': '$date'}, 'last': {'$max': '$date'}}},
+        {'$match': {'references': {'$gte': 2}, 'first': {'$lte': datetime(2020, 1, 2)}, 'last': {'$gte': datetime(2020, 1, 2)}}},
+        {'$project': {'_id': 1}}]
+
+
+def test_focals_argument_requires_values():
+    parser = argparse.ArgumentParser()
+    add_focal_filter_arguments(parser)
+    with pytest.raises(SystemExit):
+        parser.parse_args(['--focals'])
@@ -0,0 +1,36 @@
+import os
+
+from scipy.sparse import csr_matrix
+
+from dataset_caches import DatasetCache, dataset_cache_key
+from datasets import SklearnDataset, TimelineDataset
+
+metrics = TimelineDataset.Metrics(3, 1, 1 / 3, 2, 1, 2 / 3, 1, 0, 1.0)
+
+
+def dataset(rows: int) -> SklearnDataset:
+    return SklearnDataset(csr_matrix([[i, 0, i % 2] for i in range(rows)]), [i % 2 for i in range(rows)],
+                          [(list(range(rows - 1)), [rows - 1])])
+
+
+def test_dataset_cache_round_trip(tmp_path):
+    cache = DatasetCache(str(tmp_path))
+    key = dataset_cache_key('fingerprint', 'processor', 'dicterizer')
+    assert cache.get(key) is None
+    cache.put(key, dataset(4), metrics)
+    loaded, loaded_metrics = cache.get(key)
+    assert (loaded.X != dataset(4).X).nnz == 0
+    assert list(loaded.y) == [0, 1, 0, 1]
+    assert [(list(train), list(test)) for train, test in loaded.splits] == [([0, 1, 2], [3])]
+    assert loaded_metrics == metrics
+
+
+def test_dataset_cache_evicts_least_recently_used(tmp_path):
+    cache = DatasetCache(str(tmp_path))
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, dataset(4), metrics)
+        os.utime(tmp_path / key, (i, i))
+    cache.get('a')
+    cache.max_bytes = cache.size() * 2 // 3
+    cache.evict()
+    assert cache.keys() == ['c', 'a']
@@ -1,10 +1,11 @@
+import math
 from datetime import datetime
 import numpy as np
 
 import pytest
 
 from timelines import Timeline, Reference
-from datasets import TimelineDataset, FeatureClass, timeline_to_sklearn_dataset
+from datasets import TimelineDataset, FeatureClass, timeline_to_sklearn_dataset, timeline_to_hashed_batches
 from dicterizers import counting_dicterizer
 
 now = datetime.now()
@@ -69,3 +70,43 @@ def test_metrics():
     assert metrics.test_positive_classes == 1
     assert metrics.test_negative_classes == 1
     assert metrics.test_class_ratio == 0.5
+
+
+def test_metrics_of_empty_split():
+    metrics = TimelineDataset.metrics_of([FeatureClass.POSITIVE], [False])
+    assert metrics.test_datasets == 0
+    assert math.isnan(metrics.test_class_ratio)
+    assert metrics.test_to_training_ratio == 0
+
+
+def test_timeline_dataset_batches():
+    timeline: Timeline = [Reference('Reference_A', now)]
+    dataset = TimelineDataset([timeline] * 5, [FeatureClass.POSITIVE] * 5, [False, True, False, False, True])
+    assert [len(batch.feature_classes()) for batch in dataset.batches(2)] == [2, 2, 1]
+    assert [len(batch.feature_classes()) for batch in dataset.batches(2, test=False)] == [2, 1]
+    assert [batch.test_indices() for batch in dataset.batches(2, test=True)] == [[0, 1]]
+
+
+def test_timeline_to_hashed_batches():
+    timeline: Timeline = [Reference('Reference_A', now), Reference('Reference_A', now)]
+    dataset = TimelineDataset([timeline, timeline], [FeatureClass.POSITIVE, FeatureClass.NEGATIVE], [False, True])
+    batches = list(timeline_to_hashed_batches(dataset, counting_dicterizer, test=False, n_features=8))
+    assert len(batches) == 1
+    assert batches[0].X.shape == (1, 8)
+    assert batches[0].X.sum() == 2
+    assert batches[0].y == [1]
+
+
+def test_timeline_to_hashed_batches_across_datasets():
+    timeline: Timeline = [Reference('Reference_A', now)]
+    datasets = [TimelineDataset([timeline] * n, [FeatureClass.POSITIVE] * n, [False] * n) for n in (1, 2, 4)]
+    batches = list(timeline_to_hashed_batches(iter(datasets), counting_dicterizer, test=False, n_features=8, batch_size=3))
+    assert [batch.X.shape[0] for batch in batches] == [3, 3, 1]
+
+
+def test_timeline_to_sklearn_dataset_with_vocabulary():
+    timeline: Timeline = [Reference('Reference_A', now), Reference('Reference_A', now), Reference('Reference_B', now)]
+    timeline_dataset = TimelineDataset([timeline], [FeatureClass.POSITIVE], [False])
+    sklearn_dataset = timeline_to_sklearn_dataset(timeline_dataset, counting_dicterizer,
+                                                  vocabulary=['Reference_A', 'Reference_C'])
+    assert np.all(sklearn_dataset.X.toarray() == [2, 0])
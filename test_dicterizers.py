@@ -1,7 +1,14 @@
-from datetime import datetime
+import math
+from datetime import datetime, timedelta
 
+import numpy
+import pytest
+
+from test_utils import day
 from timelines import Timeline, Reference
-from dicterizers import counting_dicterizer
+from datasets import TimelineDataset, FeatureClass, timeline_to_sklearn_dataset
+from dicterizers import counting_dicterizer, log_counting_dicterizer, decay_dicterizer, CooccurrenceDicterizer
+from focals import Focal
 
 
 now = datetime.now()
@@ -14,3 +21,66 @@ def test_counting_dicterizer():
         Reference('A', now)
     ]
     assert counting_dicterizer(timeline) == {'A': 2, 'B': 1}
+
+
+def test_log_counting_dicterizer():
+    timeline: Timeline = [
+        Reference('A', now),
+        Reference('B', now),
+        Reference('A', now)
+    ]
+    assert log_counting_dicterizer(timeline) == {'A': pytest.approx(math.log(3)), 'B': pytest.approx(math.log(2))}
+    assert log_counting_dicterizer([]) == {}
+
+
+def test_decay_dicterizer():
+    timeline: Timeline = [
+        Reference('A', day[1]),
+        Reference('B', day[2]),
+        Reference('A', day[3])
+    ]
+    dicterizer = decay_dicterizer(timedelta(days=1))
+    assert dicterizer(timeline) == {'A': pytest.approx(1.25), 'B': pytest.approx(0.5)}
+    assert dicterizer([]) == {}
+    assert dicterizer.__name__ == 'decay_dicterizer(1)'
+    assert decay_dicterizer(timedelta(hours=12)).__name__ == 'decay_dicterizer(0.5)'
+
+
+def test_weighted_dicterizers_transform_like_their_feature_dicts():
+    from sklearn.feature_extraction import DictVectorizer
+    timelines = [[Reference('A', day[1]), Reference('B', day[2]), Reference('A', day[3])], [], [Reference('C', day[2])]]
+    for dicterizer in [log_counting_dicterizer, decay_dicterizer(timedelta(days=1))]:
+        expected = DictVectorizer().fit_transform([dicterizer(timeline) for timeline in timelines]).toarray()
+        assert dicterizer.transform(timelines).toarray() == pytest.approx(expected)
+        dataset = TimelineDataset(timelines, [FeatureClass.POSITIVE] * 3, [False] * 3)
+        X = timeline_to_sklearn_dataset(dataset, dicterizer, vocabulary=['C', 'D', 'A']).X.toarray()
+        assert X == pytest.approx(numpy.array([[row[0], row[2], 0] for row in expected.tolist()]))
+
+
+def test_cooccurrence_dicterizer():
+    focals = [Focal('Focal_A', [Reference('A', now), Reference('B', now)]),
+              Focal('Focal_B', [Reference('A', now), Reference('B', now), Reference('C', now)]),
+              Focal('Focal_C', [Reference('C', now)])]
+    dicterizer = CooccurrenceDicterizer(focals)
+    assert dicterizer.feature_names() == ['A', 'B', 'C']
+    timelines = [[Reference('A', now), Reference('A', now)], [Reference('C', now)], [Reference('D', now)]]
+    X = dicterizer.transform(timelines)
+    assert X.toarray().tolist() == [[0, 4, 2], [1, 1, 0], [0, 0, 0]]
+    assert dicterizer(timelines[0]) == {'B': 4, 'C': 2}
+    assert CooccurrenceDicterizer(focals).transform(timelines).toarray().tolist() == X.toarray().tolist()
+
+
+def test_cooccurrence_dicterizer_in_sklearn_dataset():
+    focals = [Focal('Focal_A', [Reference('A', now), Reference('B', now)])]
+    dataset = TimelineDataset([[Reference('A', now)]], [FeatureClass.POSITIVE], [False])
+    dicterizer = CooccurrenceDicterizer(focals)
+    assert timeline_to_sklearn_dataset(dataset, dicterizer).X.toarray().tolist() == [[0, 1]]
+    assert timeline_to_sklearn_dataset(dataset, dicterizer, vocabulary=['B']).X.toarray().tolist() == [[1]]
+
+
+def test_cooccurrence_dicterizer_cache_is_bounded():
+    corpora = [[Focal('Focal_A', [Reference('A', now), Reference(f'B{i}', now)])] for i in range(CooccurrenceDicterizer.cache_size + 2)]
+    for focals in corpora:
+        CooccurrenceDicterizer(focals)
+    assert len(CooccurrenceDicterizer._CooccurrenceDicterizer__cache) == CooccurrenceDicterizer.cache_size
+    assert CooccurrenceDicterizer(corpora[-1]).feature_names() == ['A', f'B{len(corpora) - 1}']
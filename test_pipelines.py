@@ -0,0 +1,47 @@
+import threading
+import time
+
+import pytest
+
+from pipelines import pipelined
+
+
+def test_pipelined_keeps_order():
+    assert list(pipelined(range(100), 3)) == list(range(100))
+    assert list(pipelined(range(100), 0)) == list(range(100))
+
+
+def test_pipelined_is_bounded():
+    produced = []
+
+    def items():
+        for i in range(10):
+            produced.append(i)
+            yield i
+
+    iterator = pipelined(items(), 2)
+    assert next(iterator) == 0
+    time.sleep(0.2)
+    assert len(produced) <= 4
+    iterator.close()
+
+
+def test_pipelined_runs_ahead_in_another_thread():
+    threads = set()
+
+    def items():
+        for i in range(3):
+            threads.add(threading.get_ident())
+            yield i
+
+    assert list(pipelined(items(), 1)) == [0, 1, 2]
+    assert threads and threading.get_ident() not in threads
+
+
+def test_pipelined_propagates_errors():
+    def items():
+        yield 1
+        raise ValueError('failed')
+
+    with pytest.raises(ValueError):
+        list(pipelined(items(), 2))
@@ -26,6 +26,14 @@ def test_filter_and_slice_to_most_recent_but_without_the_reference():
     assert result.feature_classes() == [FeatureClass.NEGATIVE]
 
 
+def test_filter_and_slice_to_most_recent_labels():
+    timeline: Timeline = [Reference(name='Reference_A', date=now), Reference(name='Reference_B', date=now)]
+    for filtered_entity, feature_class in [('Reference_B', FeatureClass.POSITIVE), ('SomethingDifferent', FeatureClass.NEGATIVE)]:
+        y, test = FilterAndSliceToMostRecentProcessor(filtered_entity).labels(timeline)
+        assert y == [feature_class]
+        assert len(test) == 1
+
+
 def test_timepoint():
     entity_name = 'Reference_B'
     timeline: Timeline = [Reference(name='Reference_A', date=day[1]),
@@ -132,3 +140,52 @@ def test_windowing_processor_with_limit_not_containing_entity_2_day():
     assert result.feature_dicts(counting_dicterizer) == [{'Reference_1': 1, 'Reference_2': 1}]
     assert result.feature_classes() == [FeatureClass.NEGATIVE]
     assert result.test_indices() == []
+
+
+def test_labels_match_datasets():
+    entity_name = 'Reference_X'
+    timeline: Timeline = [Reference(name='Reference_1', date=day[1]),
+                          Reference(name=entity_name, date=day[2]),
+                          Reference(name='Reference_3', date=day[3]),
+                          Reference(name='Reference_4', date=day[6]),
+                          Reference(name=entity_name, date=day[7]),
+                          Reference(name='Reference_8', date=day[8]),
+                          Reference(name='Reference_9', date=day[11])]
+    processors = [TimepointProcessor(entity_name, day[4]),
+                  SlicingProcessor(entity_name, day[4]),
+                  WindowingProcessor(entity_name, day[4], timedelta(days=2))]
+    for processor in processors:
+        dataset = processor(timeline)
+        assert processor.labels(timeline) == (dataset.feature_classes(), dataset.test_flags())
+
+
+def test_focals_to_timeline_dataset_with_negative_sampling():
+    entity_name = 'Reference_X'
+    positive = Focal('Focal_A', [Reference(name=entity_name, date=day[1]),
+                                 Reference(name=entity_name, date=day[3])])
+    negatives = [Focal(f'Focal_{i}', [Reference(name=f'Reference_{i}', date=day[1]),
+                                      Reference(name=f'Reference_{i}', date=day[2])]) for i in range(10)]
+    processor = TimepointProcessor(entity_name, day[2])
+    sampling = NegativeSampling(ratio=1.0, seed=7)
+    dataset = focals_to_timeline_dataset([positive] + negatives, processor, sampling)
+    metrics = dataset.metrics()
+    assert dataset.feature_classes().count(FeatureClass.POSITIVE) == 2
+    assert dataset.feature_classes().count(FeatureClass.NEGATIVE) == 2
+    assert metrics.negative_sampling_rate == 2 / 20
+    assert focals_to_metrics([positive] + negatives, processor, sampling) == metrics
+    again = focals_to_timeline_dataset([positive] + negatives, processor, sampling)
+    assert again.feature_dicts(counting_dicterizer) == dataset.feature_dicts(counting_dicterizer)
+    streamed = TimelineDataset.concatenate(list(FocalDatasets([positive] + negatives, processor, sampling)))
+    assert streamed.feature_dicts(counting_dicterizer) == dataset.feature_dicts(counting_dicterizer)
+    assert FocalDatasets([positive] + negatives, processor, sampling).metrics() == metrics
+
+
+def test_windowing_processor_sample():
+    entity_name = 'Reference_X'
+    timeline: Timeline = [Reference(name='Reference_1', date=day[1]),
+                          Reference(name='Reference_2', date=day[2]),
+                          Reference(name='Reference_3', date=day[3])]
+    processor = WindowingProcessor(entity_name, day[2], timedelta(days=1))
+    decisions = iter([False, True])
+    result = processor.sample(timeline, lambda: next(decisions))
+    assert result.feature_dicts(counting_dicterizer) == [{'Reference_2': 1}]
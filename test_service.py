@@ -0,0 +1,79 @@
+import json
+import threading
+from http.server import HTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from database import ReferencePopularity
+from focals import Focal, DistributionPoint
+from processors import TimepointProcessor, WindowingProcessor
+from service import Corpus, JobSpec, job_processors, run_job, validate_job, InvalidJob, handler_for
+from test_utils import day
+from timelines import Reference
+
+corpus = Corpus(version='v1',
+                focals=[Focal('Focal_A', [Reference('Reference_A', day[1]),
+                                          Reference('Reference_X', day[2]),
+                                          Reference('Reference_B', day[3]),
+                                          Reference('Reference_X', day[4])]),
+                        Focal('Focal_B', [Reference('Reference_B', day[1]),
+                                          Reference('Reference_C', day[3])])],
+                highest_distribution_point=DistributionPoint(day[3], 2),
+                references=[ReferencePopularity('Reference_X', 1), ReferencePopularity('Reference_B', 2)])
+
+
+def test_job_processors():
+    processors = job_processors(JobSpec(references=1, weeks=[1, 2]), corpus)
+    assert [p.limit.days for p in processors] == [7, 14]
+    assert all(isinstance(p, WindowingProcessor) and p.entity_name == 'Reference_X' for p in processors)
+    assert job_processors(JobSpec(processor='TimepointProcessor', references=2), corpus) == \
+        [TimepointProcessor('Reference_X', day[3]), TimepointProcessor('Reference_B', day[3])]
+    with pytest.raises(ValueError):
+        job_processors(JobSpec(references=3), corpus)
+    with pytest.raises(ValueError):
+        job_processors(JobSpec(processor='Unknown', references=1), corpus)
+
+
+def test_run_job():
+    spec = JobSpec(processor='TimepointProcessor', references=2, test_class_ratio_max_divergence=0.5, prune=False)
+    results = run_job(corpus, spec)
+    assert len(results.accepted) + len(results.off_limits) == 2
+
+
+def test_validate_job():
+    validate_job(JobSpec(references=2), corpus)
+    validate_job(JobSpec(references=2, dicterizers=['counting_dicterizer', 'decay_dicterizer(7)']), corpus)
+    for spec in [JobSpec(references=3), JobSpec(weeks=[0]), JobSpec(dicterizers=['unknown']), JobSpec(classifiers=['unknown']),
+                 JobSpec(negative_ratio=0)]:
+        with pytest.raises(InvalidJob):
+            validate_job(spec, corpus)
+
+
+class FailingService:
+    def submit(self, spec: JobSpec):
+        if spec.references > 2:
+            raise InvalidJob('too many references')
+        raise ZeroDivisionError('division by zero')
+
+
+def post(port: int, body: dict):
+    try:
+        with urlopen(f'http://127.0.0.1:{port}/jobs', data=json.dumps(body).encode('utf-8')) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_handler_status_codes():
+    server = HTTPServer(('127.0.0.1', 0), handler_for(FailingService()))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        port = server.server_address[1]
+        assert post(port, {'unknown': 1})[0] == 400
+        assert post(port, {'references': 3}) == (400, {'error': 'too many references'})
+        assert post(port, {'references': 1}) == (500, {'error': 'ZeroDivisionError: division by zero'})
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,39 @@
+import json
+
+from telemetry import Telemetry, Histogram
+
+
+def test_histogram():
+    histogram = Histogram([1, 10])
+    for value in (0.5, 1, 5, 50):
+        histogram.observe(value)
+    assert histogram.counts == [2, 1, 1]
+    assert histogram.cumulative_counts() == [2, 3, 4]
+    assert histogram.count == 4
+    assert histogram.sum == 56.5
+
+
+def test_telemetry_files(tmp_path):
+    log_path = str(tmp_path / 'log.jsonl')
+    metrics_path = str(tmp_path / 'metrics.prom')
+    telemetry = Telemetry('test', log_path, metrics_path, metrics_interval=3600)
+    telemetry.increment('tweets_total', 3)
+    telemetry.observe('upsert_seconds', 0.02, [0.01, 0.1])
+    telemetry.set('tweets_per_second', 1.5)
+    telemetry.event('batch', tweets=3)
+    log_file = telemetry._Telemetry__log_file
+    telemetry.event('batch', tweets=4)
+    assert telemetry._Telemetry__log_file is log_file
+    telemetry.write_metrics()
+    with open(log_path) as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry['event'] for entry in entries] == ['batch', 'batch']
+    assert [entry['tweets'] for entry in entries] == [3, 4]
+    telemetry.close()
+    with open(metrics_path) as f:
+        metrics = f.read().splitlines()
+    assert 'test_tweets_total 3' in metrics
+    assert 'test_tweets_per_second 1.5' in metrics
+    assert 'test_upsert_seconds_bucket{le="0.1"} 1' in metrics
+    assert 'test_upsert_seconds_bucket{le="+Inf"} 1' in metrics
+    assert 'test_upsert_seconds_count 1' in metrics
@@ -0,0 +1,24 @@
+import time
+
+import pytest
+
+from timeouts import call_with_timeout, Timeout
+
+
+def test_call_with_timeout_returns_value():
+    assert call_with_timeout(lambda: 42, 5) == 42
+
+
+def test_call_with_timeout_raises_exception():
+    def fail():
+        raise ValueError('failed')
+
+    with pytest.raises(ValueError):
+        call_with_timeout(fail, 5)
+
+
+def test_call_with_timeout_cuts_off():
+    t_start = time.time()
+    with pytest.raises(Timeout):
+        call_with_timeout(lambda: time.sleep(10), 0.2)
+    assert time.time() - t_start < 5
@@ -0,0 +1,58 @@
+import json
+from datetime import datetime, timezone
+
+from tweets import parse_tweet_json, scrape_hashtags, normalize_document, tweet_references
+
+scraped = {'url': 'https://twitter.com/user/status/1', 'date': '2021-03-04T05:06:07+00:00',
+           'content': ' Hello #World @other ', 'id': 1, 'user': {'username': 'user'},
+           'replyCount': 1, 'retweetCount': 2, 'likeCount': 3, 'outlinks': ['https://a', 'https://b'],
+           'mentionedUsers': [{'username': 'other'}]}
+
+
+def test_scrape_hashtags():
+    assert scrape_hashtags('#a b #c_d') == ['#a', '#c_d']
+
+
+def test_parse_tweet_json_scraped():
+    tweet = parse_tweet_json(json.dumps(scraped))
+    assert tweet['username'] == 'user'
+    assert tweet['id'] == '1'
+    assert tweet['date'] == datetime(2021, 3, 4, 5, 6, 7, tzinfo=timezone.utc)
+    assert tweet['hashtags'] == ['#World']
+    assert tweet['mentions'] == ['@other']
+    assert tweet['urls'] == 'https://a https://b'
+    assert tweet['focal'] == '@user'
+    assert tweet['references'] == ['#World', '@other']
+
+
+def test_parse_tweet_json_without_mentions():
+    tweet = parse_tweet_json(json.dumps({**scraped, 'mentionedUsers': None}))
+    assert tweet['mentions'] == []
+    assert tweet['references'] == ['#World']
+
+
+def test_parse_tweet_json_normalized():
+    tweet = parse_tweet_json(json.dumps({'id': '1', 'username': 'user', 'date': '2021-03-04 05:06:07'}))
+    assert tweet == {'id': '1', 'username': 'user', 'date': datetime(2021, 3, 4, 5, 6, 7),
+                     'hashtags': [], 'mentions': [], 'focal': '@user', 'references': []}
+
+
+def test_parse_tweet_json_blank():
+    assert parse_tweet_json('  \n') is None
+
+
+def test_tweet_references():
+    assert tweet_references(['#a', '', '#a'], ['@b', '@'], 'c') == ['#a', '@b', '@c']
+    assert tweet_references([], [], '') == []
+
+
+def test_normalize_document_legacy():
+    legacy = {'_id': '1', 'id': '1', 'username': 'user', 'to': '', 'date': '2021-03-04 05:06:07',
+              'hashtags': '#a #b', 'mentions': ''}
+    document = normalize_document(legacy)
+    assert document['date'] == datetime(2021, 3, 4, 5, 6, 7)
+    assert document['hashtags'] == ['#a', '#b']
+    assert document['mentions'] == []
+    assert document['focal'] == '@user'
+    assert document['references'] == ['#a', '#b']
+    assert normalize_document(document) == document
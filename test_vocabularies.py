@@ -0,0 +1,24 @@
+from focals import Focal
+from test_utils import now
+from timelines import Reference
+from vocabularies import build_vocabulary, VocabularySettings
+
+focals = [Focal('Focal_A', [Reference('A', now), Reference('A', now), Reference('B', now), Reference('C', now)]),
+          Focal('Focal_B', [Reference('A', now), Reference('B', now)]),
+          Focal('Focal_C', [Reference('A', now), Reference('D', now)])]
+
+
+def test_build_vocabulary_keeps_everything_by_default():
+    assert build_vocabulary(focals, VocabularySettings()).names == ('A', 'B', 'C', 'D')
+
+
+def test_build_vocabulary_min_focals():
+    assert build_vocabulary(focals, VocabularySettings(min_focals=2)).names == ('A', 'B')
+
+
+def test_build_vocabulary_max_size():
+    assert build_vocabulary(focals, VocabularySettings(max_size=3)).names == ('A', 'B', 'C')
+
+
+def test_build_vocabulary_excluded():
+    assert build_vocabulary(focals, VocabularySettings(excluded=frozenset({'A'}))).names == ('B', 'C', 'D')
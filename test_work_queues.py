@@ -0,0 +1,59 @@
+import time
+from datetime import timedelta
+
+import pytest
+
+from work_queues import LocalTaskQueue, UnfinishedRunError, renewed_lease
+
+
+def test_local_task_queue():
+    queue = LocalTaskQueue()
+    queue.enqueue(['a', 'b'])
+    first = queue.claim('worker_1', timedelta(hours=1))
+    second = queue.claim('worker_2', timedelta(hours=1))
+    assert (first.id, first.payload) == (0, 'a')
+    assert (second.id, second.payload) == (1, 'b')
+    assert queue.claim('worker_3', timedelta(hours=1)) is None
+    queue.complete(first.id, 'worker_1', 'A')
+    queue.complete(second.id, 'worker_2', 'B')
+    assert queue.unfinished() == 0
+    assert queue.results() == ['A', 'B']
+
+
+def test_local_task_queue_reclaims_expired_lease():
+    queue = LocalTaskQueue()
+    queue.enqueue(['a'])
+    abandoned = queue.claim('worker_1', timedelta(seconds=-1))
+    reclaimed = queue.claim('worker_2', timedelta(hours=1))
+    assert reclaimed.id == abandoned.id
+    assert not queue.complete(abandoned.id, 'worker_1', 'stale')
+    assert queue.unfinished() == 1
+    assert queue.complete(reclaimed.id, 'worker_2', 'A')
+    assert queue.results() == ['A']
+
+
+def test_local_task_queue_runs():
+    queue = LocalTaskQueue()
+    assert not queue.is_open()
+    queue.enqueue(['a'])
+    assert queue.is_open()
+    with pytest.raises(UnfinishedRunError):
+        queue.enqueue(['b'])
+    task = queue.claim('worker_1', timedelta(hours=1))
+    queue.complete(task.id, 'worker_1', 'A')
+    queue.close()
+    assert not queue.is_open()
+    queue.enqueue(['b'])
+    assert queue.claim('worker_1', timedelta(hours=1)).payload == 'b'
+
+
+def test_renewed_lease_outlives_the_lease():
+    queue = LocalTaskQueue()
+    queue.enqueue(['a'])
+    task = queue.claim('worker_1', timedelta(seconds=0.3))
+    with renewed_lease(queue, task.id, 'worker_1', timedelta(seconds=0.3)):
+        time.sleep(1)
+        assert queue.claim('worker_2', timedelta(hours=1)) is None
+    assert queue.complete(task.id, 'worker_1', 'A')
+    assert not queue.renew(task.id, 'worker_1', timedelta(hours=1))
+    assert queue.results() == ['A']
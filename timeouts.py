@@ -0,0 +1,39 @@
+import multiprocessing
+from typing import Callable, TypeVar
+
+T = TypeVar('T')
+
+
+class Timeout(Exception):
+    pass
+
+
+def __call_and_send(function: Callable[[], T], sender):
+    try:
+        sender.send((True, function()))
+    except Exception as e:
+        sender.send((False, e))
+    finally:
+        sender.close()
+
+
+def call_with_timeout(function: Callable[[], T], timeout: float) -> T:
+    context = multiprocessing.get_context('fork')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=__call_and_send, args=(function, sender), daemon=True)
+    process.start()
+    sender.close()
+    try:
+        if not receiver.poll(timeout):
+            process.terminate()
+            raise Timeout(f'Call did not finish within {timeout}s')
+        try:
+            succeeded, value = receiver.recv()
+        except EOFError:
+            raise Exception(f'Call exited with code {process.exitcode} without a result')
+    finally:
+        process.join()
+        receiver.close()
+    if not succeeded:
+        raise value
+    return value
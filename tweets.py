@@ -0,0 +1,83 @@
+import json
+import re
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Optional, List, Tuple
+
+
+def scrape_hashtags(string):
+    return re.findall(r'(#\w+)\b', string)
+
+
+def tweet_references(hashtags: List[str], mentions: List[str], to: str) -> List[str]:
+    candidates = hashtags + mentions + (['@' + to] if to else [])
+    return list(dict.fromkeys(reference for reference in candidates if reference and reference != '@'))
+
+
+def normalize_tweet(tweet):
+    username = tweet.user.username.strip()
+    hashtags = scrape_hashtags(tweet.content.strip())
+    mentions = ['@' + user.username for user in tweet.mentionedUsers] if tweet.mentionedUsers is not None else []
+    return {
+        "username": username,
+        "to": '',
+        "text": tweet.content.strip(),
+        "retweets": tweet.retweetCount,
+        "favorites": tweet.likeCount,
+        "replies": tweet.replyCount,
+        "id": str(tweet.id),
+        "permalink": tweet.url.strip(),
+        "author_id": '',
+        "date": tweet.date,
+        "formatted_date": tweet.date.isoformat(),
+        "hashtags": hashtags,
+        "mentions": mentions,
+        "geo": '',
+        "urls": (' '.join(tweet.outlinks)).strip(),
+        "focal": '@' + username,
+        "references": tweet_references(hashtags, mentions, '')
+    }
+
+
+def normalize_document(doc: dict) -> dict:
+    hashtags = doc.get('hashtags') or []
+    mentions = doc.get('mentions') or []
+    hashtags = hashtags.split() if type(hashtags) is str else hashtags
+    mentions = mentions.split() if type(mentions) is str else mentions
+    to = (doc.get('to') or '').strip()
+    date = doc['date']
+    return {**doc,
+            'date': datetime.fromisoformat(date) if type(date) is str else date,
+            'hashtags': hashtags,
+            'mentions': mentions,
+            'focal': '@' + doc['username'],
+            'references': tweet_references(hashtags, mentions, to)}
+
+
+def __as_object(value):
+    if type(value) is dict:
+        return SimpleNamespace(**{k: __as_object(v) for k, v in value.items()})
+    elif type(value) is list:
+        return [__as_object(v) for v in value]
+    return value
+
+
+def parse_tweet_json(line: str) -> Optional[dict]:
+    line = line.strip()
+    if not line:
+        return None
+    raw = json.loads(line)
+    if 'username' in raw:
+        return normalize_document(raw)
+    tweet = __as_object(raw)
+    tweet.date = datetime.fromisoformat(raw['date'])
+    tweet.outlinks = raw.get('outlinks') or []
+    tweet.mentionedUsers = tweet.mentionedUsers if hasattr(tweet, 'mentionedUsers') else None
+    return normalize_tweet(tweet)
+
+
+def try_parse_tweet_json(line: str) -> Tuple[Optional[dict], Optional[str]]:
+    try:
+        return parse_tweet_json(line), None
+    except (ValueError, KeyError, TypeError, AttributeError) as e:
+        return None, f'{type(e).__name__}: {e}'
@@ -1,10 +1,14 @@
 import argparse
-import re
+import time
 from datetime import datetime
 
-from snscrape.modules import twitter
-
 from database import get_local_database, materialize_views, get_current_users
+from telemetry import Telemetry
+from tweets import normalize_tweet
+
+BATCH_SIZE_BUCKETS = (1, 10, 100, 1000, 10000)
+
+telemetry = Telemetry('user_collector')
 
 
 def log(msg):
@@ -19,55 +23,49 @@ class TweetCollection:
         self.db = get_local_database()
         self.db_collection = self.db.tweets
 
-    def save(self, tweet):
-        doc = {**tweet, '_id': tweet['id']}
-        self.db_collection.replace_one({'_id': doc['_id']}, doc, True)
+    def save(self, tweets):
+        from pymongo import ReplaceOne
+        start = time.monotonic()
+        self.db_collection.bulk_write([ReplaceOne({'_id': tweet['id']}, {**tweet, '_id': tweet['id']}, upsert=True)
+                                       for tweet in tweets], ordered=False)
+        telemetry.observe('upsert_seconds', time.monotonic() - start)
 
     def add_all(self, tweets):
         previous_len = len(self.processed_tweet_ids)
+        telemetry.observe('batch_size', len(tweets), BATCH_SIZE_BUCKETS)
         for tweet in tweets:
             self.processed_tweet_ids.add(tweet['id'])
             if tweet['username'] != self.username:
                 print(
                     f"Saving username {tweet['username']} while the collection is for {self.username}. Probably it is an alias. Add {self.username}to .usercollectorignore to mark it as done.")
-            self.save(tweet)
+        self.save(tweets)
         current_len = len(self.processed_tweet_ids)
         if previous_len == current_len:
             raise Exception('No new tweets added!')
+        telemetry.increment('tweets_total', current_len - previous_len)
+        telemetry.set('tweets_per_second', telemetry.rate('tweets_total'))
+        telemetry.event('batch', username=self.username, tweets=current_len - previous_len, total=current_len,
+                        tweets_per_second=telemetry.gauges['tweets_per_second'])
         log(f'Processed {current_len - previous_len} tweet(s). Total: {len(self.processed_tweet_ids)}')
 
 
-def scrape_hashtags(string):
-    return re.findall(r'(#\w+)\b', string)
-
-
-def normalize_tweet(tweet):
-    return {
-        "username": tweet.user.username.strip(),
-        "to": '',
-        "text": tweet.content.strip(),
-        "retweets": tweet.retweetCount,
-        "favorites": tweet.likeCount,
-        "replies": tweet.replyCount,
-        "id": str(tweet.id),
-        "permalink": tweet.url.strip(),
-        "author_id": '',
-        "date": tweet.date,
-        "formatted_date": tweet.date.isoformat(),
-        "hashtags": (' '.join(scrape_hashtags(tweet.content.strip()))).strip(),
-        "mentions": (' '.join(list(map(lambda x: '@' + x.username,
-                                       tweet.mentionedUsers))) if tweet.mentionedUsers is not None else '').strip(),
-        "geo": '',
-        "urls": (' '.join(tweet.outlinks)).strip()
-    }
-
-
-def collect(username):
+def collect(username, batch_size: int = 100):
+    from snscrape.modules import twitter
     tweet_collection = TweetCollection(username)
     tweets = twitter.TwitterUserScraper(username).get_items()
-    for tweet in tweets:
-        normalized_tweet = normalize_tweet(tweet)
-        tweet_collection.add_all([normalized_tweet])
+    batch = []
+    while True:
+        start = time.monotonic()
+        tweet = next(tweets, None)
+        telemetry.observe('scraper_wait_seconds', time.monotonic() - start)
+        if tweet is None:
+            break
+        batch.append(normalize_tweet(tweet))
+        if len(batch) >= batch_size:
+            tweet_collection.add_all(batch)
+            batch = []
+    if batch:
+        tweet_collection.add_all(batch)
     return tweet_collection.processed_tweet_ids
 
 
@@ -91,9 +89,11 @@ def most_popular_referenced_users():
         yield username
 
 
-def get(username):
+def get(username, batch_size: int = 100):
     log(f'Getting tweets of user {username}')
-    processed_tweet_ids = collect(username)
+    telemetry.event('collection_started', username=username)
+    processed_tweet_ids = collect(username, batch_size)
+    telemetry.event('collection_finished', username=username, tweets=len(processed_tweet_ids))
     log(f'Finished successfully. Processed {len(processed_tweet_ids)} tweets.')
 
 
@@ -102,14 +102,21 @@ if __name__ == '__main__':
     parser.add_argument('action', nargs=1,
                         help='list (lists the most popular referenced user without tweets in the database), get (retrieves tweets of a specified user), next (get tweets of the first user from the list)')
     parser.add_argument('user', nargs='?')
+    parser.add_argument('--batch-size', type=int, default=100, help='tweets upserted per bulk write')
+    parser.add_argument('--metrics-log', default='user_collector.metrics.jsonl', help='file to append structured JSON log lines to')
+    parser.add_argument('--metrics-file', default='user_collector.prom', help='metrics text file refreshed during collection')
+    parser.add_argument('--metrics-interval', type=float, default=10, help='seconds between refreshes of the metrics file')
     args = parser.parse_args()
+    telemetry.log_path = args.metrics_log
+    telemetry.metrics_path = args.metrics_file
+    telemetry.metrics_interval = args.metrics_interval
     action = args.action[0]
     if action == 'get':
         if args.user is None:
             parser.print_help()
         else:
             username = args.user
-            get(username)
+            get(username, args.batch_size)
     elif action == 'list':
         users = most_popular_referenced_users()
         for i in range(3):
@@ -118,11 +125,17 @@ if __name__ == '__main__':
         users = most_popular_referenced_users()
         username = next(users)
         try:
-            get(username)
+            get(username, args.batch_size)
         finally:
             print('Materializing views...')
             start = datetime.now()
             materialize_views()
-            print(f'Finished materializing in {datetime.now() - start}')
+            duration = datetime.now() - start
+            telemetry.observe('materialization_seconds', duration.total_seconds())
+            telemetry.event('materialized', seconds=duration.total_seconds())
+            telemetry.write_metrics()
+            print(f'Finished materializing in {duration}')
     else:
         parser.print_help()
+    telemetry.write_metrics()
+    telemetry.close()
@@ -0,0 +1,29 @@
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional, FrozenSet, Tuple
+
+from focals import Focal
+from timelines import EntityName
+
+
+@dataclass(frozen=True)
+class VocabularySettings:
+    min_focals: int = 1
+    max_size: Optional[int] = None
+    excluded: FrozenSet[EntityName] = frozenset()
+
+
+@dataclass(frozen=True)
+class Vocabulary:
+    settings: VocabularySettings
+    names: Tuple[EntityName, ...]
+
+
+def build_vocabulary(focals: List[Focal], settings: VocabularySettings) -> Vocabulary:
+    focal_counts = Counter(name for focal in focals for name in {reference.name for reference in focal.timeline})
+    candidates = [(name, count) for name, count in focal_counts.items()
+                  if count >= settings.min_focals and name not in settings.excluded]
+    candidates.sort(key=lambda candidate: (-candidate[1], candidate[0]))
+    if settings.max_size is not None:
+        candidates = candidates[:settings.max_size]
+    return Vocabulary(settings, tuple(sorted(name for name, _ in candidates)))
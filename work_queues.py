@@ -0,0 +1,173 @@
+import contextlib
+import pickle
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Dict
+
+TaskId = int
+WorkerId = str
+
+
+@dataclass(frozen=True)
+class Task:
+    id: TaskId
+    payload: Any
+
+
+class TaskQueue:
+    def enqueue(self, payloads: List[Any]): ...
+
+    def claim(self, worker: WorkerId, lease: timedelta) -> Optional[Task]: ...
+
+    def renew(self, task_id: TaskId, worker: WorkerId, lease: timedelta) -> bool: ...
+
+    def complete(self, task_id: TaskId, worker: WorkerId, result: Any) -> bool: ...
+
+    def unfinished(self) -> int: ...
+
+    def results(self) -> List[Any]: ...
+
+    def is_open(self) -> bool: ...
+
+    def close(self): ...
+
+
+class UnfinishedRunError(Exception):
+    pass
+
+
+class LocalTaskQueue(TaskQueue):
+    @dataclass
+    class Entry:
+        payload: Any
+        status: str = 'pending'
+        worker: Optional[WorkerId] = None
+        lease_expires: Optional[datetime] = None
+        result: Any = None
+
+    __entries: Dict[TaskId, Entry]
+
+    def __init__(self):
+        self.__entries = {}
+        self.__open = False
+        self.__lock = threading.Lock()
+
+    def enqueue(self, payloads: List[Any]):
+        with self.__lock:
+            unfinished = sum(1 for entry in self.__entries.values() if entry.status != 'done')
+            if unfinished > 0:
+                raise UnfinishedRunError(f'{unfinished} task(s) of the previous run are unfinished')
+            self.__entries = {i: LocalTaskQueue.Entry(payload) for i, payload in enumerate(payloads)}
+            self.__open = True
+
+    def claim(self, worker: WorkerId, lease: timedelta) -> Optional[Task]:
+        now = datetime.utcnow()
+        with self.__lock:
+            for task_id, entry in self.__entries.items():
+                if entry.status == 'pending' or (entry.status == 'running' and entry.lease_expires < now):
+                    entry.status = 'running'
+                    entry.worker = worker
+                    entry.lease_expires = now + lease
+                    return Task(task_id, entry.payload)
+        return None
+
+    def renew(self, task_id: TaskId, worker: WorkerId, lease: timedelta) -> bool:
+        with self.__lock:
+            entry = self.__entries[task_id]
+            if entry.status == 'running' and entry.worker == worker:
+                entry.lease_expires = datetime.utcnow() + lease
+                return True
+            return False
+
+    def complete(self, task_id: TaskId, worker: WorkerId, result: Any) -> bool:
+        with self.__lock:
+            entry = self.__entries[task_id]
+            if entry.status == 'running' and entry.worker == worker:
+                entry.status = 'done'
+                entry.result = result
+                return True
+            return False
+
+    def unfinished(self) -> int:
+        with self.__lock:
+            return sum(1 for entry in self.__entries.values() if entry.status != 'done')
+
+    def results(self) -> List[Any]:
+        with self.__lock:
+            return [self.__entries[task_id].result for task_id in sorted(self.__entries)]
+
+    def is_open(self) -> bool:
+        with self.__lock:
+            return self.__open
+
+    def close(self):
+        with self.__lock:
+            self.__open = False
+
+
+class MongoTaskQueue(TaskQueue):
+    RUN_ID = 'run'
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    def enqueue(self, payloads: List[Any]):
+        unfinished = self.unfinished()
+        if unfinished > 0:
+            raise UnfinishedRunError(f'{unfinished} task(s) of the previous run are unfinished in {self.collection.name}')
+        self.collection.delete_many({})
+        if payloads:
+            self.collection.insert_many([{'_id': i, 'payload': pickle.dumps(payload), 'status': 'pending', 'worker': None,
+                                          'lease_expires': None, 'result': None} for i, payload in enumerate(payloads)])
+        self.collection.insert_one({'_id': MongoTaskQueue.RUN_ID, 'status': 'open'})
+
+    def claim(self, worker: WorkerId, lease: timedelta) -> Optional[Task]:
+        from pymongo import ReturnDocument
+        now = datetime.utcnow()
+        doc = self.collection.find_one_and_update(
+            {'$or': [{'status': 'pending'}, {'status': 'running', 'lease_expires': {'$lt': now}}]},
+            {'$set': {'status': 'running', 'worker': worker, 'lease_expires': now + lease}},
+            sort=[('_id', 1)],
+            return_document=ReturnDocument.AFTER)
+        return None if doc is None else Task(doc['_id'], pickle.loads(doc['payload']))
+
+    def renew(self, task_id: TaskId, worker: WorkerId, lease: timedelta) -> bool:
+        return self.collection.update_one({'_id': task_id, 'status': 'running', 'worker': worker},
+                                          {'$set': {'lease_expires': datetime.utcnow() + lease}}).matched_count > 0
+
+    def complete(self, task_id: TaskId, worker: WorkerId, result: Any) -> bool:
+        return self.collection.update_one({'_id': task_id, 'status': 'running', 'worker': worker},
+                                          {'$set': {'status': 'done', 'result': pickle.dumps(result)}}).matched_count > 0
+
+    def unfinished(self) -> int:
+        return self.collection.count_documents({'status': {'$in': ['pending', 'running']}})
+
+    def results(self) -> List[Any]:
+        docs = self.collection.find({'_id': {'$ne': MongoTaskQueue.RUN_ID}}, {'result': 1}).sort('_id', 1)
+        return [None if doc['result'] is None else pickle.loads(doc['result']) for doc in docs]
+
+    def is_open(self) -> bool:
+        return self.collection.count_documents({'_id': MongoTaskQueue.RUN_ID, 'status': 'open'}) > 0
+
+    def close(self):
+        self.collection.update_one({'_id': MongoTaskQueue.RUN_ID}, {'$set': {'status': 'closed'}})
+
+
+@contextlib.contextmanager
+def renewed_lease(queue: TaskQueue, task_id: TaskId, worker: WorkerId, lease: timedelta):
+    stopped = threading.Event()
+
+    def renew():
+        while not stopped.wait(lease.total_seconds() / 3):
+            if not queue.renew(task_id, worker, lease):
+                print(f'Worker {worker} lost the lease of task {task_id}')
+                return
+
+    thread = threading.Thread(target=renew, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()